@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+
+# ==============================================================================
+# POMOCNÉ FUNKCE
+# ==============================================================================
+
+# Převede jedno datum (date, datetime, Timestamp) na celočíselný klíč dne
+def to_day_key(date) -> int:
+    return int(np.datetime64(pd.Timestamp(date).date(), "D").astype(np.int64))
+
+
+# Převede pole nebo index dat na pole celočíselných klíčů dnů
+def to_day_keys(dates) -> np.ndarray:
+    if not isinstance(dates, pd.DatetimeIndex):
+        dates = pd.DatetimeIndex(pd.to_datetime(dates))
+    return dates.values.astype("datetime64[D]").astype(np.int64)
+
+
+# ==============================================================================
+# INDEX PRO VYHLEDÁVÁNÍ K DATU (ASOF)
+# ==============================================================================
+
+class AsofIndex:
+    def __init__(self, index):
+        # Seřazené klíče dnů časové řady
+        self._keys = to_day_keys(index)
+
+    # Vrátí pozici posledního záznamu s datem <= zadanému datu (-1 = datum předchází řadě)
+    def locate(self, date) -> int:
+        return int(np.searchsorted(self._keys, to_day_key(date), side="right")) - 1
+
+    # Vrátí pozice pro mnoho dat najednou (jedno binární vyhledání nad celým polem)
+    def locate_many(self, dates) -> np.ndarray:
+        return np.searchsorted(self._keys, to_day_keys(dates), side="right") - 1
+
+    # Vrátí počet záznamů řady
+    def __len__(self) -> int:
+        return len(self._keys)
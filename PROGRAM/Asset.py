@@ -1,13 +1,30 @@
+import sys
+import threading
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 from datetime import datetime
+import matplotlib.dates as mdates
 from matplotlib.lines import Line2D
-from DownloadManager import YfinanceManager, fill_gaps
+from matplotlib.collections import LineCollection
+from DownloadManager import YfinanceManager, fill_gaps, get_last_business_day
+from PricePanel import PricePanel, build_price_panel, remove_stale_generations
+from AssetCache import AssetCache
+from AsofIndex import AsofIndex
+from DayCalendar import day_calendar
 
 # Inicializace globálního manažera pro Yahoo Finance
 yfinance_manager = YfinanceManager()
 
+# Sdílený paměťově mapovaný panel historií všech aktiv
+price_panel = PricePanel()
+
+# Výchozí adresář generovaných grafů
+GRAPHS_DIRECTORY = '../GRAPHS'
+
+# Šířka grafu v pixelech (12 palců při 150 dpi), více bodů už čára nezobrazí
+PLOT_WIDTH_PIXELS = 12 * 150
+
 
 # ==============================================================================
 # POMOCNÉ FUNKCE
@@ -15,12 +32,11 @@ yfinance_manager = YfinanceManager()
 
 # Vytvoří prázdný DataFrame s přednastavenými sloupci od zadaného data do dneška
 def create_dataframe_from_date(start_date) -> pd.DataFrame:
-    # Vytvoření rozsahu datumů
-    dates = pd.date_range(start=start_date, end=datetime.now().date(), freq='D')
+    # Rozsah datumů jako výřez sdíleného kalendáře
+    dates = day_calendar.get_dates(start_date)
 
     # Inicializace DataFrame s indexem Date
-    df = pd.DataFrame(index=dates)
-    df.index.name = "Date"
+    df = pd.DataFrame(index=dates.rename("Date"))
 
     # Předdefinování prázdných sloupců
     df["Base"] = np.nan
@@ -32,27 +48,91 @@ def create_dataframe_from_date(start_date) -> pd.DataFrame:
     return df
 
 
-# Najde nejbližší dostupnou hodnotu v daném sloupci k zadanému datu
-def get_closest_value(df: pd.DataFrame, wanted_date, column: str):
-    # Seřazení podle indexu pro správné fungování metody asof
-    df = df.sort_index()
+# Vrátí historii seřazenou podle data s hodnotami pouze pro čtení (sdílené výřezy nelze omylem změnit)
+def freeze_history(history: pd.DataFrame) -> pd.DataFrame:
+    # Řazení jen v případě potřeby (uložená i stažená data bývají seřazená)
+    if not history.index.is_monotonic_increasing:
+        history = history.sort_index()
 
-    # Vyhledání nejbližšího předchozího indexu
-    target_idx = df.index.asof(wanted_date)
+    # Sloupce jako pohledy pouze pro čtení (bez kopírování dat)
+    columns = {}
+    for column in history.columns:
+        values = history[column].to_numpy()
+        values.setflags(write=False)
+        columns[column] = values
 
-    # Pokud není nalezen, použije se první dostupný
-    if pd.isna(target_idx):
-        target_idx = df.index[0]
+    return pd.DataFrame(columns, index=history.index, copy=False)
+
+
+# Najde nejbližší dostupnou hodnotu v daném sloupci k zadanému datu (df musí být seřazený podle data)
+def get_closest_value(df: pd.DataFrame, wanted_date, column: str, asof_index: AsofIndex = None):
+    # Vyhledání nejbližšího předchozího záznamu (předem spočítaný index lze předat)
+    if asof_index is None:
+        asof_index = AsofIndex(df.index)
+    position = asof_index.locate(wanted_date)
 
-    return df[column].loc[target_idx]
+    # Pokud není nalezen, použije se první dostupný
+    return df[column].iloc[max(position, 0)]
 
 
 # ==============================================================================
 # VIZUALIZACE
 # ==============================================================================
 
-# Vykreslí graf vývoje ceny s vyznačením statistik
-def plot_price(history: pd.DataFrame, start_date, plot_name: str, column: str):
+# Vybere indexy bodů metodou Largest-Triangle-Three-Buckets (zachová tvar čáry při menším počtu bodů)
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Hranice košů pro vnitřní body (první a poslední bod zůstávají vždy)
+    bounds = (np.arange(threshold - 1) * (n - 2) / (threshold - 2)).astype(np.int64) + 1
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    previous = 0
+    for i in range(threshold - 2):
+        low, high = bounds[i], bounds[i + 1]
+        next_high = bounds[i + 2] if i + 2 < len(bounds) else n
+
+        # Bod koše s největším trojúhelníkem mezi předchozím vybraným bodem a průměrem dalšího koše
+        avg_x = x[high:next_high].mean()
+        avg_y = y[high:next_high].mean()
+        area = np.abs((x[previous] - avg_x) * (y[low:high] - y[previous])
+                      - (x[previous] - x[low:high]) * (avg_y - y[previous]))
+        previous = low + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        selected[i + 1] = previous
+
+    return selected
+
+
+# Vykreslí čáru jako jednu LineCollection (úsek mezi dny má barvu podle masky jeho prvního dne)
+def draw_masked_line(ax, dates, values: np.ndarray, mask: np.ndarray, max_points: int = None) -> LineCollection:
+    x = mdates.date2num(dates)
+
+    # Volitelné zředění dlouhých řad na počet bodů, který graf dokáže zobrazit
+    if max_points is not None and len(x) > max_points:
+        selected = lttb_indices(x, values, max_points)
+        x, values, mask = x[selected], values[selected], mask[selected]
+
+    points = np.column_stack([x, values])
+    segments = np.stack([points[:-1], points[1:]], axis=1)
+    colors = np.where(mask[:-1], 'black', 'gray')
+
+    collection = LineCollection(segments, colors=colors, linewidths=1.8)
+    ax.add_collection(collection)
+
+    # Osa X jako datumová (jako při vykreslení přes ax.plot)
+    ax.xaxis_date()
+    ax.autoscale_view()
+    return collection
+
+
+# Vykreslí graf vývoje ceny s vyznačením statistik (vrací cestu k uloženému PNG, None = bez dat)
+# (max_points = volitelné zředění dlouhých řad metodou LTTB, např. PLOT_WIDTH_PIXELS)
+def plot_price(history: pd.DataFrame, start_date, plot_name: str, column: str, directory: str = GRAPHS_DIRECTORY,
+               max_points: int = None):
     # Inicializace grafu a os
     fig, ax = plt.subplots(figsize=(12, 7))
 
@@ -67,42 +147,21 @@ def plot_price(history: pd.DataFrame, start_date, plot_name: str, column: str):
         data_to_plot[column] = data_to_plot[column].ffill()
     except KeyError as e:
         plt.close()
-        return
+        return None
 
     # Výpočet základních statistik pro legendu a risky
     valid_data = data_to_plot[column].dropna()
     if valid_data.empty:
         plt.close()
-        return
+        return None
 
     max_val = valid_data.max()
     min_val = valid_data.min()
     last_val = valid_data.iloc[-1]
 
-    # Vykreslení segmentů grafu (černá pro reálná data, šedá pro doplněná)
-    mask_values = data_to_plot['Mask'].values
-    if len(mask_values) > 1:
-        change_points = np.where(mask_values[:-1] != mask_values[1:])[0]
-        split_indices = [0] + (change_points + 1).tolist() + [len(data_to_plot)]
-    else:
-        split_indices = [0, len(data_to_plot)]
-
-    for i in range(len(split_indices) - 1):
-        start_idx = split_indices[i]
-        end_idx = split_indices[i + 1]
-
-        # Určení rozsahu řezu
-        slice_end = end_idx + 1 if end_idx < len(data_to_plot) and len(mask_values) > 1 else end_idx
-        segment = data_to_plot.iloc[start_idx:slice_end]
-
-        if segment.empty:
-            continue
-
-        # Určení barvy podle masky (True = Černá, False = Šedá)
-        is_real = bool(mask_values[start_idx]) if start_idx < len(mask_values) else bool(mask_values[0])
-        line_color = 'black' if is_real else 'gray'
-
-        ax.plot(segment.index, segment[column], color=line_color, linewidth=1.8)
+    # Vykreslení čáry jedním objektem (černá pro reálná data, šedá pro doplněná)
+    draw_masked_line(ax, data_to_plot.index, data_to_plot[column].to_numpy(dtype=np.float64),
+                     data_to_plot['Mask'].to_numpy(dtype=bool), max_points)
 
     # Vykreslení horizontálních statistických linek
     ax.axhline(y=max_val, color="forestgreen", linestyle='dotted', linewidth=1, alpha=0.7)
@@ -145,9 +204,10 @@ def plot_price(history: pd.DataFrame, start_date, plot_name: str, column: str):
     )
 
     # Uložení grafu do souboru
-    filename = f"../GRAPHS/{plot_name}.png"
+    filename = f"{directory}/{plot_name}.png"
     plt.savefig(filename, bbox_inches='tight', dpi=150)
     plt.close()
+    return filename
 
 
 # ==============================================================================
@@ -155,19 +215,121 @@ def plot_price(history: pd.DataFrame, start_date, plot_name: str, column: str):
 # ==============================================================================
 
 class Asset:
-    def __init__(self, ticker):
+    def __init__(self, ticker, lazy: bool = False):
         self._ticker = ticker
-        self._stock_info = self.manager.get_info(ticker)
-        self._daily_history = self.manager.get_history(ticker)
-        self._name = self._stock_info.get("longName", self._ticker)
+        self._stock_info = None
+        self._daily_history = None
+        self._earliest_record_date = None
+        self._asof_index = None
+        self._history_version = 0
+        self._history_is_mapped = False
+        self._load_lock = threading.Lock()
+
+        # Zpětné volání cache, kterému aktivum hlásí změnu velikosti svých dat
+        self._size_callback = None
+
+        # Bez odloženého načítání se informace i historie získají hned při vytvoření
+        if not lazy:
+            self._get_stock_info()
+            self._get_history()
+
+    # Vrátí informace o aktivu (při prvním přístupu je načte)
+    def _get_stock_info(self) -> dict:
+        if self._stock_info is None:
+            with self._load_lock:
+                if self._stock_info is None:
+                    self._stock_info = self.manager.get_info(self._ticker)
+        return self._stock_info
+
+    # Vrátí historii aktiva (při prvním přístupu ji načte)
+    def _get_history(self) -> pd.DataFrame:
+        if self._daily_history is None:
+            with self._load_lock:
+                if self._daily_history is None:
+                    self._set_history(self._load_history())
+        return self._daily_history
+
+    # Uloží načtenou historii jako seřazenou a neměnnou a zapamatuje si datum prvního záznamu
+    def _set_history(self, history: pd.DataFrame):
+        # Historie z panelu je seřazená a namapovaná jen pro čtení už z principu
+        if not self._history_is_mapped:
+            history = freeze_history(history)
+
+        self._earliest_record_date = history.index[0] if len(history) else None
+        self._asof_index = AsofIndex(history.index)
+        self._daily_history = history
+        self._history_version += 1
+        self._report_size()
+
+    # Ohlásí cache novou velikost dat aktiva
+    def _report_size(self):
+        if self._size_callback is not None:
+            self._size_callback()
+
+    # Nastaví zpětné volání pro hlášení změny velikosti (volá cache při vložení aktiva)
+    def set_size_callback(self, callback):
+        self._size_callback = callback
+
+    # Načte historii z cenového panelu (pokud je aktuální), jinak přes manažera stahování
+    def _load_history(self) -> pd.DataFrame:
+        if self._ticker in price_panel and price_panel.get_last_record_date(self._ticker) >= get_last_business_day():
+            self._history_is_mapped = True
+            return price_panel.get_history(self._ticker)
+
+        return self.manager.get_history(self._ticker)
+
+    # Háček pro zneplatnění mezipamětí odvozených z historie (přepisují potomci)
+    def _on_history_refresh(self):
+        pass
+
+    # Znovu načte historii aktiva (např. po stažení nových dat) a zneplatní odvozené mezipaměti
+    def refresh_history(self):
+        with self._load_lock:
+            self._history_is_mapped = False
+            self._set_history(self._load_history())
+        self._on_history_refresh()
+
+    # Vrátí verzi historie (zvyšuje se s každým načtením, podle ní se zneplatňují odvozené výsledky)
+    def get_history_version(self) -> int:
+        self._get_history()
+        return self._history_version
+
+    # Zjistí, zda už byla historie aktiva načtena
+    def is_history_loaded(self) -> bool:
+        return self._daily_history is not None
+
+    # Odhadne paměť dat držených aktivem v bajtech (namapované hodnoty z panelu se nepočítají)
+    def memory_usage(self) -> int:
+        history = self._daily_history
+        if history is None:
+            return 0
+
+        # Index dat bez hlubokého průchodu (objekty date mají stejnou velikost, stačí jeden)
+        size = history.index.memory_usage(deep=False)
+        if history.index.dtype == object and len(history):
+            size += len(history) * sys.getsizeof(history.index[0])
+        if not self._history_is_mapped:
+            size += int(history.memory_usage(index=False).sum())
+        return size
+
+    # Aktiva se stejným tickerem jsou zaměnitelná (i nově vytvořená instance po vyřazení z cache)
+    def __eq__(self, other) -> bool:
+        return type(self) is type(other) and self._ticker == other._ticker
+
+    def __hash__(self) -> int:
+        return hash((type(self).__name__, self._ticker))
+
+    # Zjistí, zda je historie aktiva namapována z cenového panelu
+    def is_history_mapped(self) -> bool:
+        return self._history_is_mapped
 
     # Vrátí krátký název aktiva
     def get_short_name(self):
-        return self._stock_info.get("shortName", self._ticker)
+        return self._get_stock_info().get("shortName", self._ticker)
 
     # Vrátí burzu, na které se aktivum obchoduje
     def get_venue(self) -> str:
-        return self._stock_info.get("exchange", None)
+        return self._get_stock_info().get("exchange", None)
 
     # Vrátí očištěný ticker
     def get_ticker(self) -> str:
@@ -175,109 +337,207 @@ class Asset:
 
     # Vrátí dlouhý název aktiva
     def get_name(self) -> str:
-        return self._name
+        return self._get_stock_info().get("longName", self._ticker)
 
     # Vrátí měnu aktiva
     def get_currency(self) -> str:
-        return self._stock_info.get("currency", None)
+        return self._get_stock_info().get("currency", None)
 
     # Vrátí datum nejstaršího záznamu v historii
     def get_earliest_record_date(self) -> datetime:
-        self._daily_history.sort_index()
-        return self._daily_history.index[0]
-
-    # Vygeneruje a uloží graf zavírací ceny
-    def plot_closing_price(self):
-        plot_price(
-            self._daily_history,
-            self.get_earliest_record_date(),
-            f"{self._name} closing price graph",
-            "Close"
-        )
-
-    # Vrátí výřez historie cen od zadaného data
-    def get_prices(self, start_date) -> pd.DataFrame:
-        self._daily_history.sort_index()
-        nearest_row = self._daily_history.index.asof(start_date)
-
-        if pd.isna(nearest_row):
-            return self._daily_history.copy()
-
-        return self._daily_history.loc[nearest_row:].copy()
+        self._get_history()
+        return self._earliest_record_date
+
+    # Vygeneruje a uloží graf zavírací ceny (s rendererem se graf jen zařadí do dávky)
+    def plot_closing_price(self, renderer=None):
+        chart = (self._get_history(), self.get_earliest_record_date(), f"{self.get_name()} closing price graph", "Close")
+        if renderer is not None:
+            renderer.add(*chart)
+        else:
+            plot_price(*chart)
+
+    # Vrátí výřez historie cen od zadaného data (bez kopie a pouze pro čtení, copy=True pro úpravy)
+    def get_prices(self, start_date, copy: bool = False) -> pd.DataFrame:
+        history = self._get_history()
+        position = self._asof_index.locate(start_date)
+
+        prices = history.iloc[max(position, 0):]
+        return prices.copy() if copy else prices
+
+    # Vrátí záznam historie platný k danému datu (None, pokud datum předchází historii)
+    def get_record(self, date) -> pd.Series:
+        history = self._get_history()
+        position = self._asof_index.locate(date)
+        return history.iloc[position] if position >= 0 else None
+
+    # Vrátí záznamy platné k mnoha datům najednou (řádky před začátkem historie jsou prázdné)
+    def get_records(self, dates) -> pd.DataFrame:
+        history = self._get_history()
+        positions = self._asof_index.locate_many(dates)
+
+        records = history.iloc[np.clip(positions, 0, None)]
+        records = records.mask(np.broadcast_to((positions < 0)[:, None], records.shape))
+        records.index = dates
+        return records
+
+    # Vrátí první záznam historie
+    def get_first_record(self) -> pd.Series:
+        return self._get_history().iloc[0]
 
 
 class Stock(Asset):
-    def __init__(self, ticker):
+    def __init__(self, ticker, lazy: bool = False):
         self.manager = yfinance_manager
-        super().__init__(ticker)
+        super().__init__(ticker, lazy)
 
 
 class Commodity(Asset):
-    def __init__(self, ticker):
+    def __init__(self, ticker, lazy: bool = False):
         self.manager = yfinance_manager
-        super().__init__(ticker)
+        super().__init__(ticker, lazy)
 
 
 class Crypto(Asset):
-    def __init__(self, ticker):
+    def __init__(self, ticker, lazy: bool = False):
         self.manager = yfinance_manager
-        super().__init__(ticker)
+        super().__init__(ticker, lazy)
 
 
 class ETF(Asset):
-    def __init__(self, ticker):
+    def __init__(self, ticker, lazy: bool = False):
         self.manager = yfinance_manager
-        super().__init__(ticker)
+        super().__init__(ticker, lazy)
 
 
 class Futures(Asset):
-    def __init__(self, ticker):
+    def __init__(self, ticker, lazy: bool = False):
         self.manager = yfinance_manager
-        super().__init__(ticker)
-        # U futures preferujeme krátký název kvůli expiracím
-        self._name = self._stock_info.get("shortName", self._ticker)
+        super().__init__(ticker, lazy)
+
+    # U futures preferujeme krátký název kvůli expiracím
+    def get_name(self) -> str:
+        return self.get_short_name()
 
 
 class Forex(Asset):
-    def __init__(self, ticker):
+    def __init__(self, ticker, lazy: bool = False):
         self.manager = yfinance_manager
-        super().__init__(ticker)
-
-    # Rozšířená metoda get_prices pro Forex, která doplňuje chybějící víkendy
-    def get_prices(self, start_date) -> pd.DataFrame:
-        self._daily_history.sort_index()
-        self._daily_history = fill_gaps(self._daily_history)
-        return self._daily_history.loc[start_date:].copy()
+        self._filled_history = None
+        self._filled_asof_index = None
+        self._filled_lock = threading.Lock()
+        super().__init__(ticker, lazy)
+
+    # Paměť zahrnuje i doplněnou denní historii
+    def memory_usage(self) -> int:
+        filled = self._filled_history
+        return super().memory_usage() + (int(filled.memory_usage(deep=False).sum()) if filled is not None else 0)
+
+    # Doplněná historie se po obnovení historie musí spočítat znovu
+    def _on_history_refresh(self):
+        with self._filled_lock:
+            self._filled_history = None
+
+    # Vrátí historii doplněnou o chybějící dny (počítá se jednou, data jsou pouze pro čtení)
+    def _get_filled_history(self) -> pd.DataFrame:
+        with self._filled_lock:
+            if self._filled_history is None:
+                filled = fill_gaps(self._get_history())
+                values = filled.to_numpy(dtype=np.float64)
+                values.setflags(write=False)
+                self._filled_history = pd.DataFrame(values, index=filled.index, columns=filled.columns, copy=False)
+                self._filled_asof_index = AsofIndex(filled.index)
+                self._report_size()
+            return self._filled_history
+
+    # Rozšířená metoda get_prices pro Forex, která vrací denní výřez s doplněnými víkendy (bez kopie)
+    def get_prices(self, start_date, copy: bool = False) -> pd.DataFrame:
+        filled = self._get_filled_history()
+        prices = filled.iloc[max(day_calendar.get_offset(start_date, filled.index[0]), 0):]
+        return prices.copy() if copy else prices
 
     # Vrátí aktuální nebo nejbližší kurz
-    def get_rate(self, date=datetime.now()) -> float:
-        return get_closest_value(self._daily_history, date, "Close")
+    def get_rate(self, date=None) -> float:
+        filled = self._get_filled_history()
+        return get_closest_value(filled, date if date is not None else datetime.now(), "Close", self._filled_asof_index)
+
+    # Vrátí nejbližší kurzy k mnoha datům najednou
+    def get_rates(self, dates) -> np.ndarray:
+        filled = self._get_filled_history()
+        positions = np.clip(self._filled_asof_index.locate_many(dates), 0, None)
+        return filled["Close"].to_numpy()[positions]
 
 
 # ==============================================================================
 # TOVÁRNY (CREATORS) A CACHE
 # ==============================================================================
 
-forex_cache = {}
-asset_cache = {}
+# Omezené LRU cache instancí (rozpočet paměti lze nastavit přes set_max_bytes, výchozí je bez omezení)
+forex_cache = AssetCache()
+asset_cache = AssetCache()
+
+# Zámky tickerů, aby souběžná tvorba stejného aktiva vytvořila jen jednu instanci
+_creator_locks = {}
+_creator_locks_guard = threading.Lock()
+
+
+# Vrátí zámek pro tvorbu instance daného tickeru
+def _get_creator_lock(ticker: str) -> threading.Lock:
+    with _creator_locks_guard:
+        if ticker not in _creator_locks:
+            _creator_locks[ticker] = threading.Lock()
+        return _creator_locks[ticker]
 
 
 # Vytvoří nebo vrátí existující instanci Forexu
-def forex_creator(from_currency, to_currency) -> Forex:
+def forex_creator(from_currency, to_currency, lazy: bool = False) -> Forex:
     ticker = f"{from_currency}{to_currency}=X"
-    if ticker in forex_cache:
-        return forex_cache[ticker]
 
-    forex_obj = Forex(ticker)
-    forex_cache[ticker] = forex_obj
-    return forex_obj
+    # Rychlá cesta pro již vytvořené instance (bez zamykání)
+    forex_obj = forex_cache.get(ticker)
+    if forex_obj is not None:
+        return forex_obj
+
+    with _get_creator_lock(ticker):
+        forex_obj = forex_cache.peek(ticker)
+        if forex_obj is not None:
+            return forex_obj
+
+        forex_obj = Forex(ticker, lazy)
+        forex_cache[ticker] = forex_obj
+        return forex_obj
+
+
+# Vytvoří nebo vrátí existující instanci Akcie (lazy = informace a historie se načtou až při prvním použití)
+def asset_creator(ticker, lazy: bool = False) -> Stock:
+    # Rychlá cesta pro již vytvořené instance (bez zamykání)
+    stock_obj = asset_cache.get(ticker)
+    if stock_obj is not None:
+        return stock_obj
 
+    with _get_creator_lock(ticker):
+        stock_obj = asset_cache.peek(ticker)
+        if stock_obj is not None:
+            return stock_obj
 
-# Vytvoří nebo vrátí existující instanci Akcie
-def asset_creator(ticker) -> Stock:
-    if ticker in asset_cache:
-        return asset_cache[ticker]
+        stock_obj = Stock(ticker, lazy)
+        asset_cache[ticker] = stock_obj
+        return stock_obj
 
-    stock_obj = Stock(ticker)
-    asset_cache[ticker] = stock_obj
-    return stock_obj
\ No newline at end of file
+
+# Uloží historie všech načtených aktiv do sdíleného cenového panelu (jen pokud se něco změnilo)
+def save_price_panel():
+    # Ukládají se jen aktiva s načtenou historií, která nepochází z panelu (ostatní tickery panel převezme)
+    assets = [asset for asset in asset_cache.values() + forex_cache.values()
+              if asset.is_history_loaded() and not asset.is_history_mapped()]
+    if not assets:
+        return
+
+    histories = {asset._ticker: asset.get_prices(asset.get_earliest_record_date()) for asset in assets}
+
+    # Selhání zápisu panelu (např. zamčený soubor) nesmí ukončit vyhodnocení, panel se jen neaktualizuje
+    try:
+        build_price_panel(histories)
+        price_panel.reload()
+        remove_stale_generations()
+    except (OSError, ValueError) as e:
+        print(f"!!! Varování: Uložení cenového panelu selhalo: {e}")
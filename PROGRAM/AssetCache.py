@@ -0,0 +1,156 @@
+import sys
+import threading
+from collections import OrderedDict
+
+
+# ==============================================================================
+# POMOCNÉ FUNKCE
+# ==============================================================================
+
+# Odhadne paměť objektu v bajtech (aktiva a DataFrame podle memory_usage)
+def estimate_size(obj) -> int:
+    memory_usage = getattr(obj, "memory_usage", None)
+    if memory_usage is None:
+        return sys.getsizeof(obj)
+
+    size = memory_usage()
+    return int(size.sum()) if hasattr(size, "sum") else int(size)
+
+
+# ==============================================================================
+# OMEZENÁ LRU CACHE AKTIV
+# ==============================================================================
+
+class AssetCache:
+    def __init__(self, max_bytes: int = None):
+        # Záznamy seřazené od nejdéle nepoužitého po naposledy použitý
+        self._entries = OrderedDict()
+
+        # Velikosti záznamů měřené při vložení (a při změně dat záznamu) a jejich součet
+        self._sizes = {}
+        self._total_bytes = 0
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        # Statistiky využití
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    # ==============================================================================
+    # VNITŘNÍ METODY
+    # ==============================================================================
+
+    # Změří jeden záznam a upraví celkový součet velikostí
+    def _measure(self, key):
+        size = estimate_size(self._entries[key])
+        self._total_bytes += size - self._sizes.get(key, 0)
+        self._sizes[key] = size
+
+    # Odebere záznam i s jeho velikostí
+    def _remove(self, key, default=None):
+        self._total_bytes -= self._sizes.pop(key, 0)
+        return self._entries.pop(key, default)
+
+    # Vyřadí nejdéle nepoužité záznamy nad rozpočet (pracuje s uloženými velikostmi, nic nepřeměřuje)
+    def _enforce_budget(self):
+        if self._max_bytes is None:
+            return
+
+        # Naposledy vložený záznam zůstává vždy, i když se do rozpočtu sám nevejde
+        while self._total_bytes > self._max_bytes and len(self._entries) > 1:
+            self._remove(next(iter(self._entries)))
+            self._evictions += 1
+
+    # ==============================================================================
+    # VEŘEJNÉ METODY
+    # ==============================================================================
+
+    # Vrátí záznam (a označí ho jako naposledy použitý), případně default; počítá zásahy a výpadky
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                self._misses += 1
+                return default
+
+            self._hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    # Vrátí záznam bez vlivu na pořadí a statistiky
+    def peek(self, key, default=None):
+        with self._lock:
+            return self._entries.get(key, default)
+
+    # Vloží záznam, změří jen jeho velikost a případně vyřadí nejdéle nepoužité záznamy nad rozpočet
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._measure(key)
+            self._enforce_budget()
+
+        # Odložená aktiva ohlásí novou velikost sama, až načtou data
+        set_size_callback = getattr(value, "set_size_callback", None)
+        if set_size_callback is not None:
+            set_size_callback(lambda: self.update_size(key))
+
+    # Přeměří jeden záznam (volá ho aktivum po načtení dat) a uplatní rozpočet
+    def update_size(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return
+            self._measure(key)
+            self._enforce_budget()
+
+    # Vrátí záznam (KeyError, pokud v cache není)
+    def __getitem__(self, key):
+        with self._lock:
+            return self._entries[key]
+
+    # Zjistí, zda je záznam v cache
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    # Vrátí počet záznamů
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # Vrátí seznam uložených hodnot
+    def values(self) -> list:
+        with self._lock:
+            return list(self._entries.values())
+
+    # Odebere záznam a vrátí ho (případně default)
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._remove(key, default)
+
+    # Zneplatní záznam tickeru (další požadavek vytvoří novou instanci s čerstvými daty)
+    def invalidate(self, ticker) -> bool:
+        return self.pop(ticker) is not None
+
+    # Vyprázdní cache
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._total_bytes = 0
+
+    # Nastaví rozpočet paměti v bajtech (None = bez omezení) a hned ho uplatní
+    def set_max_bytes(self, max_bytes: int = None):
+        with self._lock:
+            self._max_bytes = max_bytes
+            self._enforce_budget()
+
+    # Vrátí statistiky využití cache
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self._max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+            }
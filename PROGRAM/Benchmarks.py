@@ -0,0 +1,338 @@
+import os
+import time
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from MaskAlgebra import mask_and
+from Asset import Asset, draw_masked_line, PLOT_WIDTH_PIXELS
+from Transaction import LongTransaction
+from TransactionEngine import TransactionEngine
+from Position import Position
+from Portfolio import Portfolio, TransactionType
+from DownloadManager import (_delete_outliers, _normalize_history, _normalize_index, _delete_duplicit_data,
+                             _delete_flat_data, _close_initial_gap, fill_gaps)
+
+# ==============================================================================
+# POMOCNÉ FUNKCE PRO MĚŘENÍ
+# ==============================================================================
+
+# Změří nejlepší čas z několika opakování zadané funkce
+def measure(function, repeats: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+# Vypíše porovnání dvou naměřených časů
+def report(title: str, old_time: float, new_time: float):
+    print(f"{title}")
+    print(f"    Původní řešení: {old_time * 1000:10.2f} ms")
+    print(f"    Nové řešení:    {new_time * 1000:10.2f} ms")
+    print(f"    Zrychlení:      {old_time / new_time:10.1f}x")
+
+
+# Vytvoří náhodné masky platnosti dat na denní ose
+def create_random_masks(days: int, count: int, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(end=pd.Timestamp.now().normalize(), periods=days, freq='D')
+
+    # Každá maska začíná jindy (jako pozice otevřené v různých dnech)
+    masks = []
+    for _ in range(count):
+        start = int(rng.integers(0, days // 2))
+        masks.append(pd.Series(rng.random(days - start) > 0.1, index=dates[start:]))
+    return masks
+
+
+# Vytvoří syntetickou denní historii (pracovní dny) s vloženými chybnými bloky cen
+def create_synthetic_history(years: int = 30, glitches: int = 300, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=pd.Timestamp.now().normalize(), periods=years * 261)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.01, len(dates))))
+
+    # Chybné bloky: několik dní s desetinásobnou cenou
+    for start in rng.choice(np.arange(1, len(dates) - 10, 10), size=glitches, replace=False):
+        close[start:start + int(rng.integers(1, 5))] *= 10
+
+    df = pd.DataFrame({"Close": close, "High": close * 1.01, "Low": close * 0.99}, index=dates.date)
+    df.index.name = "Date"
+    return df
+
+
+# Původní odstranění outlierů (párování přes zip a drop pro každý pár) pro srovnání
+def delete_outliers_pairwise(stock_history: pd.DataFrame) -> pd.DataFrame:
+    daily_returns = stock_history['Close'].pct_change()
+    outlier_index_growth = stock_history[daily_returns > 1.0].index.tolist()
+    outlier_index_fall = stock_history[daily_returns < -0.5].index.tolist()
+
+    for start_date, end_date in zip(outlier_index_growth, outlier_index_fall):
+        index_to_delete = stock_history.loc[start_date:(end_date - pd.Timedelta(days=1))].index
+        stock_history = stock_history.drop(index_to_delete)
+
+    return stock_history
+
+
+# Původní normalizace po krocích (každý krok vlastní filtr a kopie) pro srovnání
+def normalize_history_staged(stock_history: pd.DataFrame) -> pd.DataFrame:
+    stock_history = _normalize_index(stock_history)
+    stock_history = _delete_outliers(stock_history)
+    stock_history = _delete_duplicit_data(stock_history)
+    stock_history = _delete_flat_data(stock_history)
+    stock_history = _close_initial_gap(stock_history)
+    stock_history['return'] = stock_history['Close'].pct_change()
+    stock_history.index.name = 'Date'
+    return stock_history
+
+
+# Původní kreslení grafu: samostatná čára (ax.plot) pro každý úsek se stejnou maskou
+def draw_segments_legacy(ax, data: pd.DataFrame, column: str):
+    mask_values = data['Mask'].values
+    change_points = np.where(mask_values[:-1] != mask_values[1:])[0]
+    split_indices = [0] + (change_points + 1).tolist() + [len(data)]
+
+    for start_idx, end_idx in zip(split_indices[:-1], split_indices[1:]):
+        segment = data.iloc[start_idx:min(end_idx + 1, len(data))]
+        ax.plot(segment.index, segment[column], color='black' if mask_values[start_idx] else 'gray', linewidth=1.8)
+
+
+# Původní doplnění mezer: vlastní date_range a zarovnání objektového indexu dat přes reindex
+def fill_gaps_reindex(stock_history: pd.DataFrame) -> pd.DataFrame:
+    full_date_range = pd.date_range(start=stock_history.index.min(), end=pd.Timestamp.now().date(), freq='D')
+    full_date_range.name = 'Date'
+    return stock_history[['Close', 'Low', 'High']].reindex(full_date_range).ffill()
+
+
+# Manažer dat, který místo stahování vrací připravenou historii
+class SyntheticManager:
+    def __init__(self, history: pd.DataFrame):
+        self._history = history
+
+    def get_info(self, ticker: str) -> dict:
+        return {"longName": ticker, "currency": "USD"}
+
+    def get_history(self, ticker: str) -> pd.DataFrame:
+        return self._history.copy()
+
+    def get_ticker(self, ticker: str) -> str:
+        return ticker
+
+
+# Aktivum nad syntetickou historií
+class SyntheticAsset(Asset):
+    def __init__(self, ticker: str, history: pd.DataFrame):
+        self.manager = SyntheticManager(history)
+        super().__init__(ticker)
+
+
+# Aktivum s původním přístupem k historii (zahozené řazení, kopie výřezu a asof nad výřezem při každém volání)
+class LegacySyntheticAsset(SyntheticAsset):
+    def get_earliest_record_date(self):
+        self._daily_history.sort_index()
+        return self._daily_history.index[0]
+
+    def get_prices(self, start_date, copy: bool = True) -> pd.DataFrame:
+        self._daily_history.sort_index()
+        nearest_row = self._daily_history.index.asof(start_date)
+        prices = self._daily_history if pd.isna(nearest_row) else self._daily_history.loc[nearest_row:]
+        return prices.copy()
+
+    def get_record(self, date) -> pd.Series:
+        history = self.get_prices(date)
+        nearest_row = history.index.asof(date)
+        return None if pd.isna(nearest_row) else history.loc[nearest_row]
+
+
+# ==============================================================================
+# JEDNOTLIVÉ BENCHMARKY
+# ==============================================================================
+
+# Slučování masek: Series.combine s Python lambdou vs. maskovací algebra nad poli
+def benchmark_mask_and(days: int = 3650, count: int = 200):
+    masks = create_random_masks(days, count)
+    base = pd.Series(True, index=masks[0].index.union(masks[-1].index))
+
+    def combine_loop():
+        result = base
+        for mask in masks:
+            result = result.combine(mask, func=lambda x, y: x & y, fill_value=True)
+        return result
+
+    def algebra_loop():
+        result = base
+        for mask in masks:
+            result = mask_and(result, mask)
+        return result
+
+    # Kontrola shody výsledků
+    assert (combine_loop().astype(bool) == algebra_loop()).all()
+
+    report(f"Slučování {count} masek přes {days} dní (AND)", measure(combine_loop, 1), measure(algebra_loop))
+
+
+# Odstranění outlierů: párový drop pro každý blok vs. jedna vektorizovaná maska
+def benchmark_delete_outliers(years: int = 30, glitches: int = 300):
+    history = create_synthetic_history(years, glitches)
+
+    # Kontrola shody výsledků (v syntetických datech mají všechny růsty svůj pád)
+    pd.testing.assert_frame_equal(delete_outliers_pairwise(history), _delete_outliers(history))
+
+    report(f"Odstranění {glitches} chybných bloků z {years}leté historie",
+           measure(lambda: delete_outliers_pairwise(history)), measure(lambda: _delete_outliers(history)))
+
+
+# Normalizace historie: postupné kroky s kopiemi vs. jedna maska a jeden filtr
+def benchmark_normalize_history(years: int = 30, glitches: int = 300):
+    history = create_synthetic_history(years, glitches)
+    history["Close"] = history["Close"].round(1)
+
+    # Kontrola shody výsledků
+    pd.testing.assert_frame_equal(normalize_history_staged(history.copy()), _normalize_history(history.copy()))
+
+    report(f"Normalizace {years}leté historie",
+           measure(lambda: normalize_history_staged(history.copy())), measure(lambda: _normalize_history(history.copy())))
+
+
+# Tvorba transakcí: řazení a kopie historie při každé transakci vs. neměnná historie a předpočítaný asof index
+def benchmark_transactions_on_asset(years: int = 30, count: int = 10000):
+    history = create_synthetic_history(years, glitches=0)
+    history["return"] = history["Close"].pct_change()
+    dates = np.random.default_rng(0).choice(history.index[1:], size=count)
+
+    def create_transactions(asset_class):
+        asset = asset_class("SYNTH", history)
+        engine = TransactionEngine()
+        for date in dates:
+            LongTransaction(asset, date, amount_owned=1, amount=1, engine=engine)
+
+    report(f"Vytvoření {count} transakcí nad jedním aktivem ({years}letá historie)",
+           measure(lambda: create_transactions(LegacySyntheticAsset), 1),
+           measure(lambda: create_transactions(SyntheticAsset), 1))
+
+
+# Agregace pozic portfolia: postupné sčítání sloupců a masek vs. jedna redukce nad maticí pozice x den
+def benchmark_add_positions(years: int = 10, count: int = 200):
+    history = create_synthetic_history(years, glitches=0)
+    history["return"] = history["Close"].pct_change()
+    dates = np.random.default_rng(0).choice(history.index[1:], size=(count, 3))
+
+    portfolio = Portfolio("Benchmark", "USD")
+    for i in range(count):
+        asset = SyntheticAsset(f"SYNTH{i}", history)
+        position = Position(asset, portfolio._engine, fx_rates=portfolio._fx_rates)
+        for date in sorted(dates[i]):
+            position.new_transaction(1, date, TransactionType.LONG, "USD", None)
+        portfolio._position_dict[asset] = position
+    portfolio._create_first_date()
+    portfolio._create_portfolio_prices()
+
+    # Historie pozic se spočítají předem (měří se jen agregace)
+    results = [position.get_position("USD") for position in portfolio._position_dict.values()]
+
+    def add_positions_loop():
+        prices = portfolio._portfolio_prices.copy()
+        for pos_data in results:
+            for column in ["Base", "Profit", "Price"]:
+                prices[column] = prices[column].add(pos_data[column], fill_value=0)
+            prices["Mask"] = mask_and(prices["Mask"], pos_data["Mask"])
+        return prices
+
+    def add_positions_stacked():
+        portfolio._add_positions()
+        return portfolio._portfolio_prices
+
+    # Kontrola shody výsledků
+    expected = add_positions_loop()
+    pd.testing.assert_frame_equal(add_positions_stacked(), expected, check_dtype=False)
+
+    report(f"Agregace {count} pozic portfolia ({years}leté historie)",
+           measure(add_positions_loop), measure(add_positions_stacked))
+
+
+# Kreslení grafu: čára pro každý úsek masky vs. jedna LineCollection (volitelně zředěná metodou LTTB)
+def benchmark_plot_segments(years: int = 40, gap_every: int = 20):
+    dates = pd.date_range(end=pd.Timestamp.now().normalize(), periods=years * 365, freq='D')
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame({"Price": 100 * np.exp(np.cumsum(rng.normal(0.0002, 0.01, len(dates)))),
+                         "Mask": (np.arange(len(dates)) // gap_every) % 2 == 0}, index=dates)
+
+    # Kreslení včetně vykreslení plátna (to je na počtu objektů nejvíce závislé)
+    def render(draw):
+        fig, ax = plt.subplots(figsize=(12, 7))
+        draw(ax)
+        fig.canvas.draw()
+        artists = len(ax.lines) + len(ax.collections)
+        plt.close(fig)
+        return artists
+
+    def draw_collection(max_points=None):
+        return lambda ax: draw_masked_line(ax, data.index, data["Price"].to_numpy(), data["Mask"].to_numpy(),
+                                           max_points)
+
+    print(f"Počet objektů čáry: původně {render(lambda ax: draw_segments_legacy(ax, data, 'Price'))}, "
+          f"nově {render(draw_collection())}")
+    report(f"Vykreslení {years}leté řady s mezerou v datech každých {gap_every} dní",
+           measure(lambda: render(lambda ax: draw_segments_legacy(ax, data, 'Price'))),
+           measure(lambda: render(draw_collection())))
+    report(f"Vykreslení {years}leté řady zředěné na {PLOT_WIDTH_PIXELS} bodů (LTTB)",
+           measure(lambda: render(lambda ax: draw_segments_legacy(ax, data, 'Price'))),
+           measure(lambda: render(draw_collection(PLOT_WIDTH_PIXELS))))
+
+
+# Doplnění mezer historie: zarovnání objektového indexu přes reindex vs. posuny dnů na sdíleném kalendáři
+def benchmark_fill_gaps(years: int = 30):
+    history = create_synthetic_history(years, glitches=0)
+
+    # Kontrola shody výsledků
+    pd.testing.assert_frame_equal(fill_gaps_reindex(history), fill_gaps(history))
+
+    report(f"Doplnění mezer {years}leté historie s indexem datumů",
+           measure(lambda: fill_gaps_reindex(history)), measure(lambda: fill_gaps(history)))
+
+
+# Vykreslení dávky grafů: v aktuálním procesu vs. ve sdíleném poolu procesů (první dávka včetně startu poolu)
+def benchmark_chart_rendering(counts=(4, 32), years: int = 10):
+    import tempfile
+    import ChartRenderer as chart_renderer_module
+    from ChartRenderer import ChartRenderer
+
+    dates = pd.date_range(end=pd.Timestamp.now().normalize(), periods=years * 365, freq='D', name='Date')
+    data = pd.DataFrame({"Price": 100 * np.exp(np.cumsum(np.random.default_rng(0).normal(0.0002, 0.01, len(dates)))),
+                         "Mask": True}, index=dates)
+
+    with tempfile.TemporaryDirectory() as directory:
+        serial = ChartRenderer(directory, use_processes=False)
+        pooled = ChartRenderer(directory, max_workers=max(os.cpu_count() or 1, 2), min_pool_jobs=1)
+        for count in counts:
+            jobs = [(f"Graf {i}", data, "Price", directory, PLOT_WIDTH_PIXELS) for i in range(count)]
+            serial_time = measure(lambda: serial._render_jobs(jobs), 1)
+
+            # Studený start (nový pool) a opakovaná dávka nad již běžícím poolem
+            for key in list(chart_renderer_module._pools):
+                chart_renderer_module._pools.pop(key).shutdown()
+            cold_time = measure(lambda: pooled._render_jobs(jobs), 1)
+            warm_time = measure(lambda: pooled._render_jobs(jobs), 1)
+
+            print(f"Vykreslení {count} grafů ({os.cpu_count()} CPU)")
+            print(f"    V procesu:          {serial_time * 1000:10.2f} ms")
+            print(f"    Pool, první dávka:  {cold_time * 1000:10.2f} ms   ({serial_time / cold_time:4.1f}x)")
+            print(f"    Pool, další dávka:  {warm_time * 1000:10.2f} ms   ({serial_time / warm_time:4.1f}x)")
+
+
+# ==============================================================================
+# SPUŠTĚNÍ VŠECH BENCHMARKŮ
+# ==============================================================================
+
+if __name__ == "__main__":
+    benchmark_mask_and()
+    benchmark_delete_outliers()
+    benchmark_normalize_history()
+    benchmark_transactions_on_asset()
+    benchmark_add_positions()
+    benchmark_plot_segments()
+    benchmark_fill_gaps()
+    benchmark_chart_rendering()
@@ -43,7 +43,10 @@ def load_transactions_to_portfolio(portfolio: Portfolio, file_path: str) -> bool
         transactions_df["rate"] = transactions_df["rate"].fillna(1.0)
         transactions_df = transactions_df.sort_index()
 
-        # 4. Iterace přes vyčištěná data a přidávání transakcí
+        # 4. Souběžné předběžné stažení dat všech aktiv v souboru
+        portfolio.prefetch(transactions_df["ISIN"].unique())
+
+        # 5. Iterace přes vyčištěná data a přidávání transakcí
         for row in transactions_df.itertuples():
             # Přidání transakce skrze veřejné rozhraní portfolia
             portfolio.new_transaction(
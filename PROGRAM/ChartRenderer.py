@@ -0,0 +1,160 @@
+import os
+import hashlib
+import threading
+import matplotlib
+import multiprocessing
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from Asset import plot_price, GRAPHS_DIRECTORY
+from PositionExport import content_hash
+
+# Verze vzhledu grafů (při změně kreslení se všechny grafy vykreslí znovu)
+CHART_STYLE_VERSION = 2
+
+# Upřednostňované způsoby spouštění procesů (čistý proces nezdědí vlákna ani zámky rodiče jako při fork)
+PREFERRED_START_METHODS = ["forkserver", "spawn"]
+
+# Menší dávky se kreslí v aktuálním procesu (start pracovního procesu stojí import celého programu)
+POOL_MIN_JOBS = 8
+
+# Pooly procesů sdílené všemi renderery v procesu {(počet procesů, způsob spouštění): pool}
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+# ==============================================================================
+# POMOCNÉ FUNKCE
+# ==============================================================================
+
+# Nastaví v pracovním procesu neinteraktivní backend Agg
+def _init_worker():
+    matplotlib.use("Agg")
+
+
+# Vykreslí jeden graf (volá se v pracovním procesu, proto funkce na úrovni modulu)
+def _render_chart(job: tuple) -> str:
+    name, data, column, directory, max_points = job
+    return plot_price(data, data.index[0], name, column, directory, max_points)
+
+
+# Vrátí sdílený pool procesů (vytvoří se při první potřebě a používá se znovu)
+def _get_pool(workers: int, mp_context) -> ProcessPoolExecutor:
+    key = (workers, mp_context.get_start_method())
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, initializer=_init_worker)
+        return _pools[key]
+
+
+# Zahodí pool, který přestal fungovat (další dávka vytvoří nový)
+def _discard_pool(workers: int, mp_context):
+    with _pools_lock:
+        pool = _pools.pop((workers, mp_context.get_start_method()), None)
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Spočítá otisk vstupních dat grafu včetně názvu, sloupce, zředění a verze vzhledu
+def chart_hash(name: str, data: pd.DataFrame, column: str, max_points: int = None) -> str:
+    digest = hashlib.sha1(f"{CHART_STYLE_VERSION}|{name}|{column}|{max_points}|".encode("utf-8"))
+    digest.update(content_hash(data).encode("utf-8"))
+    return digest.hexdigest()
+
+
+# ==============================================================================
+# DÁVKOVÉ VYKRESLOVÁNÍ GRAFŮ
+# ==============================================================================
+
+class ChartRenderer:
+    # use_processes=None: procesy přes forkserver/spawn (spouštěný skript musí mít guard if __name__ == "__main__")
+    # max_points: volitelné zředění dlouhých řad metodou LTTB (např. PLOT_WIDTH_PIXELS)
+    # min_pool_jobs: nejmenší dávka, pro kterou se grafy kreslí ve sdíleném poolu procesů
+    def __init__(self, directory: str = GRAPHS_DIRECTORY, max_workers: int = None, use_processes: bool = None,
+                 max_points: int = None, min_pool_jobs: int = POOL_MIN_JOBS):
+        self._directory = directory
+        self._max_workers = max_workers
+        self._max_points = max_points
+        self._min_pool_jobs = min_pool_jobs
+        self._mp_context = None
+        if use_processes is None or use_processes:
+            methods = [method for method in PREFERRED_START_METHODS if method in multiprocessing.get_all_start_methods()]
+            self._mp_context = multiprocessing.get_context(methods[0]) if methods else None
+            use_processes = self._mp_context is not None
+        self._use_processes = use_processes
+
+        # Grafy čekající na vykreslení {název: (data, sloupec, otisk)}
+        self._jobs = {}
+
+    # ==============================================================================
+    # VNITŘNÍ METODY
+    # ==============================================================================
+
+    # Vrátí cestu k PNG souboru grafu
+    def _get_path(self, name: str) -> str:
+        return f"{self._directory}/{name}.png"
+
+    # Zjistí, zda uložený graf odpovídá otisku jeho vstupních dat
+    def _is_current(self, name: str, digest: str) -> bool:
+        if not os.path.exists(self._get_path(name)):
+            return False
+        try:
+            with open(f"{self._get_path(name)}.sha1", 'r', encoding='utf-8') as f:
+                return f.read().strip() == digest
+        except FileNotFoundError:
+            return False
+
+    # Vykreslí grafy ve sdíleném poolu procesů (malou dávku nebo při selhání poolu v aktuálním procesu)
+    def _render_jobs(self, jobs: list) -> list:
+        workers = self._max_workers or os.cpu_count() or 1
+        if self._use_processes and workers > 1 and len(jobs) >= self._min_pool_jobs:
+            try:
+                return list(_get_pool(workers, self._mp_context).map(_render_chart, jobs))
+            except (OSError, BrokenProcessPool) as e:
+                _discard_pool(workers, self._mp_context)
+                print(f"!!! Varování: Paralelní vykreslení grafů selhalo, vykresluji postupně: {e}")
+
+        return [_render_chart(job) for job in jobs]
+
+    # ==============================================================================
+    # VEŘEJNÉ METODY
+    # ==============================================================================
+
+    # Zařadí graf do dávky (stejný název nahradí dříve zařazený graf)
+    def add(self, history: pd.DataFrame, start_date, name: str, column: str):
+        try:
+            data = history.loc[start_date:, [column, 'Mask']]
+        except KeyError:
+            return
+        if data.empty:
+            return
+
+        self._jobs[name] = (data, column, chart_hash(name, data, column, self._max_points))
+
+    # Vrátí počet grafů čekajících na vykreslení
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    # Vykreslí zařazené grafy, jejichž data se od posledního vykreslení změnila (vrací jejich názvy)
+    def render(self) -> list:
+        jobs = {name: job for name, job in self._jobs.items() if not self._is_current(name, job[2])}
+        self._jobs = {}
+        if not jobs:
+            return []
+
+        results = self._render_jobs([(name, data, column, self._directory, self._max_points)
+                                     for name, (data, column, _) in jobs.items()])
+
+        # Otisk se uloží jen k úspěšně vykresleným grafům
+        rendered = []
+        for (name, (_, _, digest)), filename in zip(jobs.items(), results):
+            if filename is None:
+                continue
+            try:
+                with open(f"{filename}.sha1", 'w', encoding='utf-8') as f:
+                    f.write(digest)
+            except OSError as e:
+                print(f"!!! Varování: Uložení otisku grafu {name} selhalo: {e}")
+            rendered.append(name)
+
+        return rendered
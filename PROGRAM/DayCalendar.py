@@ -0,0 +1,66 @@
+import threading
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from AsofIndex import to_day_key, to_day_keys
+
+
+# ==============================================================================
+# SDÍLENÁ DENNÍ OSA
+# ==============================================================================
+
+class DayCalendar:
+    def __init__(self):
+        # Denní osa od nejstaršího požadovaného dne do dneška (index a pole stejných dnů, mění se najednou)
+        self._axis = (pd.DatetimeIndex([], freq='D'), np.array([], dtype="datetime64[D]"))
+        self._lock = threading.Lock()
+
+    # ==============================================================================
+    # VNITŘNÍ METODY
+    # ==============================================================================
+
+    # Vrátí osu pokrývající zadaný den až dnešek (rozšíří ji jen při starším dni nebo po změně dne)
+    def _get_axis(self, start: pd.Timestamp) -> tuple:
+        today = self.get_today()
+        dates, days = self._axis
+        if len(dates) and dates[0] <= start and dates[-1] == today:
+            return dates, days
+
+        with self._lock:
+            dates, _ = self._axis
+            first = min(start, today) if not len(dates) else min(start, today, dates[0])
+            days = np.arange(np.datetime64(first.date(), "D"), np.datetime64(today.date(), "D") + 1)
+            self._axis = (pd.DatetimeIndex(days.astype("datetime64[ns]"), freq='D'), days)
+            return self._axis
+
+    # ==============================================================================
+    # VEŘEJNÉ METODY
+    # ==============================================================================
+
+    # Vrátí poslední den osy (dnešek); výsledky spočítané k jinému dni osy jsou neplatné
+    def get_today(self) -> pd.Timestamp:
+        return pd.Timestamp(datetime.now().date())
+
+    # Vrátí denní osu od zadaného dne do dneška (výřez sdílené osy bez kopírování)
+    def get_dates(self, start_date) -> pd.DatetimeIndex:
+        start = pd.Timestamp(start_date).normalize()
+        dates, _ = self._get_axis(start)
+        return dates[dates.searchsorted(start):]
+
+    # Vrátí stejnou osu jako pole numpy dnů (datetime64[D])
+    def get_days(self, start_date) -> np.ndarray:
+        start = pd.Timestamp(start_date).normalize()
+        dates, days = self._get_axis(start)
+        return days[dates.searchsorted(start):]
+
+    # Vrátí pozici dne na denní ose začínající dnem origin (celočíselný posun místo vyhledávání v indexu)
+    def get_offset(self, date, origin) -> int:
+        return to_day_key(date) - to_day_key(origin)
+
+    # Vrátí pozice mnoha dnů na denní ose začínající dnem origin
+    def get_offsets(self, dates, origin) -> np.ndarray:
+        return to_day_keys(dates) - to_day_key(origin)
+
+
+# Sdílený kalendář všech pozic, portfolií a kurzů
+day_calendar = DayCalendar()
@@ -1,8 +1,31 @@
+import os
+import time
+import threading
+import numpy as np
 import pandas as pd
 import yfinance as yf
 import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pandas.tseries.offsets import BDay
 from datetime import datetime
+from DayCalendar import day_calendar
+
+# Volitelná knihovna pro binární sloupcové formáty (Parquet, Feather)
+try:
+    import pyarrow
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+
+# ==============================================================================
+# KONFIGURACE ČIŠTĚNÍ DAT
+# ==============================================================================
+
+# Limity denní změny, nad kterými se záznam považuje za chybný výkyv (outlier)
+OUTLIER_GROWTH_THRESHOLD = 1.0
+OUTLIER_FALL_THRESHOLD = -0.5
+
 
 # ==============================================================================
 # POMOCNÉ FUNKCE PRO PRÁCI S DATY
@@ -19,27 +42,18 @@ def get_last_business_day() -> datetime:
 
 # Vyplní chybějící dny v časové řadě předchozími hodnotami
 def fill_gaps(stock_history: pd.DataFrame) -> pd.DataFrame:
-    # Vytvoření úplné datové řady od začátku historie do dneška
-    full_date_range = pd.date_range(
-        start=stock_history.index.min(),
-        end=datetime.now().date(),
-        freq='D'
-    )
-    full_date_range.name = 'Date'
-
-    # Doplnění prázdných polí Close předchozí hodnotou
-    stock_history_filled = stock_history[['Close']].reindex(full_date_range).ffill()
-
-    # Doplnění a zachování sloupce Low
-    daily_min = stock_history[["Low"]].reindex(full_date_range).ffill()
-    stock_history_filled['Low'] = daily_min
+    # Úplná denní řada od začátku historie do dneška (výřez sdíleného kalendáře)
+    full_date_range = day_calendar.get_dates(stock_history.index.min()).rename('Date')
 
-    # Doplnění a zachování sloupce High
-    daily_max = stock_history[["High"]].reindex(full_date_range).ffill()
-    stock_history_filled['High'] = daily_max
+    # Umístění záznamů na osu podle posunu dne (bez zarovnávání indexů)
+    columns = ['Close', 'Low', 'High']
+    offsets = day_calendar.get_offsets(stock_history.index, full_date_range[0])
+    on_axis = (offsets >= 0) & (offsets < len(full_date_range))
+    values = np.full((len(full_date_range), len(columns)), np.nan)
+    values[offsets[on_axis]] = stock_history[columns].to_numpy(dtype=np.float64)[on_axis]
 
-    # Vrátí doplněná data
-    return stock_history_filled
+    # Doplnění chybějících dnů předchozí hodnotou
+    return pd.DataFrame(values, index=full_date_range, columns=columns).ffill()
 
 
 # ==============================================================================
@@ -86,60 +100,112 @@ def _delete_flat_data(stock_history: pd.DataFrame) -> pd.DataFrame:
     return stock_history_clean
 
 
-# Identifikuje a odstraní nesmyslné výkyvy v datech (outliery)
-def _delete_outliers(stock_history: pd.DataFrame) -> pd.DataFrame:
-    # Nastavení limitů pro růst a pád
-    growth_threshold = 1.0
-    fall_threshold = -0.5
+# Spočítá denní procentuální změnu stejně jako pandas pct_change (chybějící cena se doplní předchozí)
+def _pct_change(values: np.ndarray) -> np.ndarray:
+    valid = ~np.isnan(values)
+    padded = values[np.maximum.accumulate(np.where(valid, np.arange(len(values)), 0))]
+
+    returns = np.full(len(values), np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns[1:] = padded[1:] / padded[:-1] - 1
+    return returns
 
-    # Výpočet denní procentuální změny
-    daily_returns = stock_history['Close'].pct_change()
 
-    # Identifikace extrémních hodnot
-    outlier_mask_growth = (daily_returns > growth_threshold)
-    outlier_mask_fall = (daily_returns < fall_threshold)
+# Vytvoří masku řádků ležících v chybném bloku (od růstového výkyvu až před následující pád)
+def _outlier_block_mask(returns: np.ndarray, growth_threshold: float, fall_threshold: float) -> np.ndarray:
+    growth = returns > growth_threshold
+    fall = returns < fall_threshold
 
-    # Získání indexů těchto hodnot
-    outlier_index_growth = stock_history[outlier_mask_growth].index.tolist()
-    outlier_index_fall = stock_history[outlier_mask_fall].index.tolist()
+    # Stav po poslední události: 1 = po růstovém výkyvu, 0 = po pádu (nebo před první událostí)
+    events = np.where(growth, 1.0, np.where(fall, 0.0, np.nan))
+    last_event = np.maximum.accumulate(np.where(np.isnan(events), 0, np.arange(len(events))))
+    state = np.nan_to_num(events[last_event], nan=0.0)
 
-    # Spárování začátků a konců chyb
-    pairs = list(zip(outlier_index_growth, outlier_index_fall))
+    # Blok se maže jen tehdy, pokud ho nějaký pád opravdu uzavře
+    fall_after = np.logical_or.accumulate(fall[::-1])[::-1]
+
+    return (state == 1) & fall_after
+
+
+# Vytvoří masku bodových výkyvů vůči klouzavému mediánu zavírací ceny
+def _outlier_median_mask(closes: pd.Series, window: int, growth_threshold: float,
+                         fall_threshold: float) -> np.ndarray:
+    median = closes.rolling(window, center=True, min_periods=1).median()
+    deviation = (closes / median - 1).to_numpy()
+    return (deviation > growth_threshold) | (deviation < fall_threshold)
+
+
+# Identifikuje a odstraní nesmyslné výkyvy v datech (outliery) jedním průchodem
+def _delete_outliers(stock_history: pd.DataFrame, growth_threshold: float = OUTLIER_GROWTH_THRESHOLD,
+                     fall_threshold: float = OUTLIER_FALL_THRESHOLD, rolling_window: int = None) -> pd.DataFrame:
+    # Výpočet denní procentuální změny
+    closes = stock_history['Close']
+    daily_returns = _pct_change(closes.to_numpy(dtype=np.float64))
+
+    # Bloky mezi růstovým výkyvem a následujícím pádem (každý růst se páruje s nejbližším dalším pádem)
+    outlier_mask = _outlier_block_mask(daily_returns, growth_threshold, fall_threshold)
+
+    # Volitelně i bodové výkyvy vůči klouzavému mediánu
+    if rolling_window is not None:
+        outlier_mask |= _outlier_median_mask(closes, rolling_window, growth_threshold, fall_threshold)
 
     # Pokud nejsou nalezeny chyby, vrátíme původní data
-    if not pairs:
+    if not outlier_mask.any():
         return stock_history
 
-    # Odstranění chybných bloků dat
-    for start_date, end_date in pairs:
-        index_to_delete = stock_history.loc[start_date:(end_date - pd.Timedelta(days=1))].index
-        stock_history = stock_history.drop(index_to_delete)
-
-    # Vrátí data bez outlierů
-    return stock_history
+    # Odstranění všech chybných řádků jedním filtrem
+    return stock_history[~outlier_mask]
 
 
-# Provede kompletní proces normalizace dat
-def _normalize_history(stock_history: pd.DataFrame) -> pd.DataFrame:
+# Sjednotí index stažených dat na seřazená čistá data
+def _normalize_index(stock_history: pd.DataFrame) -> pd.DataFrame:
     # Sjednocení formátu indexu na UTC datetime
     stock_history.index = pd.to_datetime(stock_history.index, utc=True)
 
     # Převedení indexu pouze na datumy
     stock_history.index = stock_history.index.date
 
-    # Seřazení podle data
-    stock_history = stock_history.sort_index()
+    # Seřazení podle data (stažená data bývají seřazená, kopie se pak nevytváří)
+    if not stock_history.index.is_monotonic_increasing:
+        stock_history = stock_history.sort_index()
+
+    return stock_history
+
 
-    # Postupné čištění dat
-    stock_history = _delete_outliers(stock_history)
-    stock_history = _delete_duplicit_data(stock_history)
-    stock_history = _delete_flat_data(stock_history)
-    stock_history = _close_initial_gap(stock_history)
+# Vytvoří masku ponechaných řádků pro všechny kroky čištění najednou (outliery -> duplicity -> plochá data)
+def _normalization_keep_mask(stock_history: pd.DataFrame) -> np.ndarray:
+    closes = stock_history["Close"].to_numpy(dtype=np.float64)
 
-    # Výpočet sloupce s denní výnosností
-    daily_returns = stock_history['Close'].pct_change()
-    daily_returns.name = 'return'
-    stock_history['return'] = daily_returns
+    # Chybné bloky podle denní změny surových dat
+    keep = ~_outlier_block_mask(_pct_change(closes), OUTLIER_GROWTH_THRESHOLD, OUTLIER_FALL_THRESHOLD)
+
+    # Duplicitní cena vůči předchozímu řádku, který přežil odstranění outlierů
+    kept_rows = np.flatnonzero(keep)
+    kept_closes = closes[kept_rows]
+    keep[kept_rows[1:][kept_closes[1:] == kept_closes[:-1]]] = False
+
+    # Plochá data (Low == High) nezávisí na okolních řádcích
+    keep &= stock_history["Low"].to_numpy() != stock_history["High"].to_numpy()
+
+    return keep
+
+
+# Provede kompletní proces normalizace dat jedním průchodem (jeden filtr, jedna kopie)
+def _normalize_history(stock_history: pd.DataFrame) -> pd.DataFrame:
+    # Sjednocení indexu
+    stock_history = _normalize_index(stock_history)
+
+    # Odfiltrování všech chybných řádků najednou
+    stock_history = stock_history.take(np.flatnonzero(_normalization_keep_mask(stock_history)))
+
+    # Posunutí prvního záznamu těsně před druhý (řešení mezer po filtraci)
+    if len(stock_history) > 1:
+        dates = stock_history.index.to_numpy().copy()
+        dates[0] = dates[1] - pd.Timedelta(days=1)
+        stock_history.index = dates
+
+    # Výpočet sloupce s denní výnosností nad vyčištěnými cenami
+    stock_history['return'] = _pct_change(stock_history['Close'].to_numpy(dtype=np.float64))
 
     # Nastavení názvu indexu
     stock_history.index.name = 'Date'
@@ -148,29 +214,72 @@ def _normalize_history(stock_history: pd.DataFrame) -> pd.DataFrame:
     return stock_history
 
 
+# Určí pozici, od které je nutné uloženou historii znovu normalizovat spolu s novými daty
+def _tail_window_start(history: pd.DataFrame) -> int:
+    # Standardně stačí jen nová data (poslední uložený záznam slouží jako kotva)
+    start = len(history)
+
+    # Nespárovaný růstový výkyv na konci historie může uzavřít až pád v nových datech
+    returns = history["return"].to_numpy()
+    growth_positions = np.flatnonzero(returns > OUTLIER_GROWTH_THRESHOLD)
+    fall_positions = np.flatnonzero(returns < OUTLIER_FALL_THRESHOLD)
+    if len(growth_positions) and (not len(fall_positions) or growth_positions[-1] > fall_positions[-1]):
+        start = max(int(growth_positions[-1]), 1)
+
+    return start
+
+
+# Normalizuje nově stažená data v kontextu konce uložené historie a připojí je
+def _normalize_history_tail(history: pd.DataFrame, new_rows: pd.DataFrame) -> pd.DataFrame:
+    # Pouze záznamy novější než uložená historie
+    new_rows = new_rows[new_rows.index > history.index.max()]
+    if new_rows.empty:
+        return history
+
+    # Okno historie k přepočtu včetně jednoho kotvícího záznamu před ním
+    start = _tail_window_start(history)
+    kept = history.iloc[:start - 1]
+    tail = pd.concat([history.iloc[start - 1:].drop(columns="return"), new_rows.reindex(columns=history.columns.drop("return"))])
+
+    # Čištění pouze koncového okna (počáteční mezera se řeší jen při plném stažení)
+    tail = tail.take(np.flatnonzero(_normalization_keep_mask(tail)))
+
+    # Výpočet výnosnosti a odstranění kotvy, která je už součástí uložené historie
+    tail['return'] = _pct_change(tail['Close'].to_numpy(dtype=np.float64))
+    tail = tail.iloc[1:]
+
+    # Spojení s nezměněnou částí historie
+    stock_history = pd.concat([kept, history.iloc[start - 1:start], tail])
+    stock_history.index.name = 'Date'
+
+    return stock_history
+
+
 # ==============================================================================
-# HLAVNÍ MANAŽER PRO STAHOVÁNÍ A UKLÁDÁNÍ DAT
+# ÚLOŽIŠTĚ HISTORIE (CSV A BINÁRNÍ SLOUPCOVÉ FORMÁTY)
 # ==============================================================================
 
-class DownloadManager:
+# Výchozí adresář a formát ukládané historie
+HISTORY_DIRECTORY = '../DATA/ASSET_HISTORY'
+DEFAULT_HISTORY_FORMAT = "parquet"
 
-    def __init__(self):
-        # Inicializace vnitřního tickeru
-        self._ticker = None
 
-    def get_ticker(self, ticker: str) -> str:
-        # Vrátí název tickeru
-        return ticker
+class CsvHistoryStorage:
+    extension = "csv"
 
-    # Načte historii dat z lokálního CSV souboru
-    def _load_daily_history(self) -> pd.DataFrame:
-        try:
-            # Definice cesty k souboru
-            file_path = f'../DATA/ASSET_HISTORY/{self._ticker}.history.csv'
+    def __init__(self, directory: str = HISTORY_DIRECTORY):
+        self._directory = directory
+
+    # Vrátí cestu k souboru historie daného tickeru
+    def get_path(self, ticker: str) -> str:
+        return f'{self._directory}/{ticker}.history.{self.extension}'
 
+    # Načte historii z CSV (prázdný DataFrame, pokud soubor neexistuje)
+    def load(self, ticker: str) -> pd.DataFrame:
+        try:
             # Načtení dat s nastavením indexu na datum
             stock_history = pd.read_csv(
-                file_path,
+                self.get_path(ticker),
                 index_col="Date",
                 parse_dates=True
             )
@@ -184,11 +293,245 @@ class DownloadManager:
             # Vrátí prázdný DataFrame v případě chyby
             return pd.DataFrame()
 
+    # Zapíše DataFrame do souboru ve formátu úložiště
+    def _write(self, path: str, stock_history: pd.DataFrame):
+        stock_history.to_csv(path)
+
+    # Zapíše soubor přes dočasnou cestu a atomicky ho přesune na místo (čtenář nevidí rozepsaný soubor)
+    def _replace(self, path: str, stock_history: pd.DataFrame):
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        self._write(temp_path, stock_history)
+        os.replace(temp_path, path)
+
+    # Uloží historii do CSV
+    def save(self, ticker: str, stock_history: pd.DataFrame):
+        self._replace(self.get_path(ticker), stock_history)
+
+    # Vrátí cestu k souborovému zámku tickeru (sdílenému všemi procesy nad stejným úložištěm)
+    def get_lock_path(self, ticker: str) -> str:
+        return f'{self._directory}/{ticker}.lock'
+
+
+class ParquetHistoryStorage(CsvHistoryStorage):
+    extension = "parquet"
+
+    def __init__(self, directory: str = HISTORY_DIRECTORY, float_dtype: str = "float64"):
+        super().__init__(directory)
+        self._float_dtype = float_dtype
+        self._csv_storage = CsvHistoryStorage(directory)
+
+    # Zapíše typovaný DataFrame s datovým indexem do souboru
+    def _write(self, path: str, stock_history: pd.DataFrame):
+        stock_history.to_parquet(path)
+
+    # Přečte DataFrame z binárního souboru
+    def _read(self, path: str) -> pd.DataFrame:
+        return pd.read_parquet(path)
+
+    # Načte binární historii, případně ji jednorázově převede z dosavadního CSV
+    def load(self, ticker: str) -> pd.DataFrame:
+        path = self.get_path(ticker)
+
+        # Migrace: binární soubor zatím neexistuje, ale existuje CSV
+        if not os.path.exists(path):
+            stock_history = self._csv_storage.load(ticker)
+            if not stock_history.empty:
+                self.save(ticker, stock_history)
+            return stock_history
+
+        # Načtení bez parsování textových dat a úprava indexu na čisté datum
+        stock_history = self._read(path)
+        stock_history.index = stock_history.index.date
+        return stock_history
+
+    # Uloží historii s typovanými sloupci a datovým indexem
+    def save(self, ticker: str, stock_history: pd.DataFrame):
+        typed_history = stock_history.copy()
+        typed_history.index = pd.DatetimeIndex(typed_history.index, name="Date")
+
+        # Sjednocení desetinných sloupců na zvolenou přesnost
+        float_columns = typed_history.select_dtypes("floating").columns
+        typed_history[float_columns] = typed_history[float_columns].astype(self._float_dtype)
+
+        self._replace(self.get_path(ticker), typed_history)
+
+
+class FeatherHistoryStorage(ParquetHistoryStorage):
+    extension = "feather"
+
+    # Feather (Arrow IPC) neukládá index, proto se datum ukládá jako sloupec
+    def _write(self, path: str, stock_history: pd.DataFrame):
+        stock_history.reset_index().to_feather(path)
+
+    # Přečte DataFrame z Arrow IPC souboru a obnoví datový index
+    def _read(self, path: str) -> pd.DataFrame:
+        return pd.read_feather(path).set_index("Date")
+
+
+# Dostupné formáty úložiště historie
+HISTORY_STORAGES = {
+    "csv": CsvHistoryStorage,
+    "parquet": ParquetHistoryStorage,
+    "feather": FeatherHistoryStorage,
+}
+
+
+# Vytvoří úložiště historie v zadaném formátu (bez pyarrow se použije CSV)
+def create_history_storage(history_format: str = DEFAULT_HISTORY_FORMAT,
+                           directory: str = HISTORY_DIRECTORY) -> CsvHistoryStorage:
+    if history_format not in HISTORY_STORAGES:
+        raise ValueError(f"Neznámý formát historie '{history_format}', dostupné: {', '.join(HISTORY_STORAGES)}")
+
+    if history_format != "csv" and not ARROW_AVAILABLE:
+        return CsvHistoryStorage(directory)
+
+    return HISTORY_STORAGES[history_format](directory)
+
+
+# ==============================================================================
+# OMEZENÍ RYCHLOSTI DOTAZŮ NA POSKYTOVATELE
+# ==============================================================================
+
+class RateLimiter:
+    def __init__(self, requests_per_second: float):
+        # Minimální rozestup mezi dvěma dotazy
+        self._interval = 1 / requests_per_second
+        self._next_time = 0.0
+        self._lock = threading.Lock()
+
+    # Počká, dokud není povolen další dotaz (bezpečné pro více vláken)
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_time - now
+            self._next_time = max(now, self._next_time) + self._interval
+
+        if delay > 0:
+            time.sleep(delay)
+
+
+# ==============================================================================
+# ZÁMEK TICKERU MEZI PROCESY
+# ==============================================================================
+
+# Jak dlouho se čeká na zámek jiného procesu a po jaké době se opuštěný zámek považuje za mrtvý
+LOCK_TIMEOUT = 120.0
+LOCK_STALE_SECONDS = 600.0
+
+
+class TickerFileLock:
+    def __init__(self, path: str, timeout: float = LOCK_TIMEOUT, stale_after: float = LOCK_STALE_SECONDS,
+                 poll_interval: float = 0.05):
+        self._path = path
+        self._timeout = timeout
+        self._stale_after = stale_after
+        self._poll_interval = poll_interval
+
+        # Jedinečný obsah zámku (zámek se smí smazat jen tím, kdo ho vytvořil)
+        self._token = f"{os.getpid()}:{uuid.uuid4().hex}"
+
+    # Zjistí, zda soubor zámku nebyl dlouho změněn (jeho proces nejspíš spadl)
+    def _is_stale(self, path: str) -> bool:
+        return time.time() - os.path.getmtime(path) >= self._stale_after
+
+    # Odstraní opuštěný zámek (vrací, zda lze hned zkusit zámek vytvořit znovu)
+    def _break_stale(self) -> bool:
+        try:
+            if not self._is_stale(self._path):
+                return False
+
+            # Přejmenování je atomické: opuštěný zámek převezme jen jeden z čekajících procesů
+            claimed = f"{self._path}.{uuid.uuid4().hex}.stale"
+            os.rename(self._path, claimed)
+        except FileNotFoundError:
+            return True
+
+        # Mezi kontrolou a přejmenováním mohl zámek převzít jiný proces: čerstvý zámek se vrátí na místo
+        if not self._is_stale(claimed):
+            try:
+                os.link(claimed, self._path)
+            except FileExistsError:
+                pass
+            os.remove(claimed)
+            return False
+
+        os.remove(claimed)
+        print(f"!!! Varování: Odstraňuji opuštěný zámek {self._path}")
+        return True
+
+    # Vytvoří soubor zámku atomicky (O_CREAT | O_EXCL uspěje jen jednomu procesu), jinak čeká
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+        deadline = time.monotonic() + self._timeout
+        while True:
+            try:
+                descriptor = os.open(self._path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(descriptor, self._token.encode("ascii"))
+                os.close(descriptor)
+                return self
+            except FileExistsError:
+                if self._break_stale():
+                    continue
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"Zámek {self._path} drží jiný proces")
+                time.sleep(self._poll_interval)
+
+    # Uvolní zámek smazáním jeho souboru (jen pokud ho mezitím jako opuštěný nepřevzal jiný proces)
+    def __exit__(self, *exc_info):
+        try:
+            with open(self._path, 'r', encoding='ascii') as f:
+                if f.read() != self._token:
+                    return
+            os.remove(self._path)
+        except FileNotFoundError:
+            pass
+
+
+# ==============================================================================
+# HLAVNÍ MANAŽER PRO STAHOVÁNÍ A UKLÁDÁNÍ DAT
+# ==============================================================================
+
+class DownloadManager:
+    # Omezení rychlosti dotazů a opakování při chybě (přepisováno v potomcích podle poskytovatele)
+    rate_limiter = RateLimiter(requests_per_second=5)
+    max_retries = 3
+    retry_backoff = 1.0
+
+    def __init__(self, incremental: bool = False, storage: CsvHistoryStorage = None):
+        # Úložiště historie (výchozí binární formát, bez pyarrow CSV)
+        self._storage = storage if storage is not None else create_history_storage()
+
+        # Režim aktualizace historie (True = stahují se jen nové dny)
+        self._incremental = incremental
+
+        # Zámky jednotlivých tickerů (manažer nemá jiný stav, ticker se předává v každém volání)
+        self._ticker_locks = {}
+        self._ticker_locks_guard = threading.Lock()
+
+    def get_ticker(self, ticker: str) -> str:
+        # Vrátí název tickeru
+        return ticker
+
+    # Vrátí zámek daného tickeru (souběžně lze pracovat jen s různými tickery)
+    def _get_ticker_lock(self, ticker: str) -> threading.RLock:
+        with self._ticker_locks_guard:
+            if ticker not in self._ticker_locks:
+                self._ticker_locks[ticker] = threading.RLock()
+            return self._ticker_locks[ticker]
+
+    # Vrátí souborový zámek tickeru pro zápis do cache (chrání před souběžným stažením v jiném procesu)
+    def _get_file_lock(self, ticker: str) -> TickerFileLock:
+        return TickerFileLock(self._storage.get_lock_path(ticker))
+
+    # Načte historii dat z lokálního úložiště
+    def _load_daily_history(self, ticker: str) -> pd.DataFrame:
+        return self._storage.load(ticker)
+
     # Načte meta informace o aktivu z JSON souboru
-    def _load_stock_info(self) -> dict:
+    def _load_stock_info(self, ticker: str) -> dict:
         try:
             # Definice cesty k souboru
-            file_path = f"../DATA/ASSET_INFO/{self._ticker}.info.json"
+            file_path = f"../DATA/ASSET_INFO/{ticker}.info.json"
 
             # Otevření a načtení JSON
             with open(file_path, 'r', encoding='utf-8') as f:
@@ -200,76 +543,159 @@ class DownloadManager:
             # Vrátí prázdný slovník v případě chyby
             return {}
 
-    # Abstraktní metoda pro stahování historie (přepisována v potomcích)
-    def _download_daily_history(self) -> pd.DataFrame:
+    # Zavolá poskytovatele s omezením rychlosti a opakováním s rostoucí prodlevou
+    def _request(self, function, *args, **kwargs):
+        for attempt in range(self.max_retries):
+            self.rate_limiter.wait()
+            try:
+                return function(*args, **kwargs)
+            except Exception:
+                # Poslední pokus chybu předá dál
+                if attempt == self.max_retries - 1:
+                    raise
+                time.sleep(self.retry_backoff * 2 ** attempt)
+
+    # Uloží normalizovanou historii do úložiště pro budoucí použití
+    def _save_daily_history(self, ticker: str, stock_history: pd.DataFrame):
+        file_name = self.get_ticker(ticker)
+        self._storage.save(file_name, stock_history)
+
+    # Uloží meta informace do JSON (přes dočasný soubor, aby čtenář neviděl rozepsaný soubor)
+    def _save_stock_info(self, ticker: str, stock_info: dict):
+        file_path = f"../DATA/ASSET_INFO/{ticker}.info.json"
+        temp_path = f"{file_path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(stock_info, f, indent=4)
+        os.replace(temp_path, file_path)
+
+    # Abstraktní metoda pro stažení surové historie od zadaného dne (přepisována v potomcích)
+    def _fetch_history(self, ticker: str, start=None) -> pd.DataFrame:
         return pd.DataFrame({})
 
+    # Stáhne kompletní historii, normalizuje ji a uloží
+    def _download_daily_history(self, ticker: str) -> pd.DataFrame:
+        # Stažení maximální historie
+        stock_history = self._request(self._fetch_history, ticker)
+        if stock_history.empty:
+            return stock_history
+
+        # Provedení normalizace a uložení
+        stock_history = _normalize_history(stock_history)
+        self._save_daily_history(ticker, stock_history)
+
+        # Vrátí stažená data
+        return stock_history
+
+    # Stáhne pouze dny od posledního uloženého záznamu a připojí je k historii
+    def _update_daily_history(self, ticker: str, history: pd.DataFrame) -> pd.DataFrame:
+        # Stažení od posledního uloženého dne (včetně, kvůli kontrole navázání)
+        last_date = history.index.max()
+        new_rows = self._request(self._fetch_history, ticker, start=last_date)
+        if new_rows.empty:
+            return history
+        new_rows = _normalize_index(new_rows)
+
+        # Pokud poskytovatel mezitím přepočítal ceny (split, dividenda), stáhneme vše znovu
+        if last_date in new_rows.index and not np.isclose(new_rows.loc[last_date, "Close"],
+                                                          history.loc[last_date, "Close"]):
+            return self._download_daily_history(ticker)
+
+        # Normalizace jen koncového okna a uložení
+        stock_history = _normalize_history_tail(history, new_rows)
+        self._save_daily_history(ticker, stock_history)
+
+        return stock_history
+
     # Abstraktní metoda pro stahování informací (přepisována v potomcích)
-    def _download_stock_info(self) -> dict:
+    def _download_stock_info(self, ticker: str) -> dict:
         return {}
 
+    # Zjistí, zda historie pokrývá poslední pracovní den
+    def _is_history_current(self, history: pd.DataFrame) -> bool:
+        return not history.empty and get_last_business_day() <= history.index.max()
+
     # Veřejná metoda pro získání informací (zkusí disk, pak internet)
     def get_info(self, ticker: str) -> dict:
-        self._ticker = ticker
-        info = self._load_stock_info()
-        if not info:
-            info = self._download_stock_info()
+        with self._get_ticker_lock(ticker):
+            info = self._load_stock_info(ticker)
+            if info:
+                return info
+
+            # Souborový zámek jen kolem stažení a uložení (jiný proces mohl mezitím data uložit)
+            with self._get_file_lock(ticker):
+                info = self._load_stock_info(ticker)
+                if not info:
+                    info = self._request(self._download_stock_info, ticker)
+                    if info:
+                        self._save_stock_info(ticker, info)
         return info
 
     # Veřejná metoda pro získání historie (zkusí disk, pak internet pokud jsou data stará)
     def get_history(self, ticker: str) -> pd.DataFrame:
-        self._ticker = ticker
-        history = self._load_daily_history()
-
-        # Kontrola, zda jsou data aktuální vzhledem k poslednímu pracovnímu dni
-        if history.empty or get_last_business_day() > history.index.max():
-            history = self._download_daily_history()
+        with self._get_ticker_lock(ticker):
+            history = self._load_daily_history(ticker)
+            if self._is_history_current(history):
+                return history
+
+            # Souborový zámek jen kolem stažení a uložení (jiný proces mohl mezitím historii aktualizovat)
+            with self._get_file_lock(ticker):
+                history = self._load_daily_history(ticker)
+
+                # Kontrola, zda jsou data aktuální vzhledem k poslednímu pracovnímu dni
+                if history.empty:
+                    history = self._download_daily_history(ticker)
+                elif not self._is_history_current(history):
+                    if self._incremental:
+                        history = self._update_daily_history(ticker, history)
+                    else:
+                        history = self._download_daily_history(ticker)
 
         return history
 
+    # Načte informace a historii jednoho tickeru
+    def _prefetch_ticker(self, ticker: str) -> bool:
+        try:
+            self.get_info(ticker)
+            self.get_history(ticker)
+            return True
+        except Exception as e:
+            print(f"!!! Varování: Data pro {ticker} se nepodařilo stáhnout: {e}")
+            return False
+
+    # Souběžně stáhne chybějící nebo zastaralé informace a historie pro více tickerů
+    def prefetch(self, tickers, max_workers: int = 8) -> dict:
+        unique_tickers = list(dict.fromkeys(tickers))
+        if not unique_tickers:
+            return {}
+
+        # Omezený počet vláken, rychlost dotazů hlídá sdílený limiter poskytovatele
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(self._prefetch_ticker, unique_tickers)
+
+        # Vrátí slovník {ticker: úspěch}
+        return dict(zip(unique_tickers, results))
+
 
 # ==============================================================================
 # IMPLEMENTACE KONKRÉTNÍCH API POSKYTOVATELŮ
 # ==============================================================================
 
 class YfinanceManager(DownloadManager):
+    # Yahoo Finance při rychlém dotazování vrací chyby (rate limit)
+    rate_limiter = RateLimiter(requests_per_second=2)
 
-    def __init__(self):
-        super().__init__()
-        self._yahoo_ticker_obj = None
+    # Stáhne surová historická data z Yahoo Finance (bez startu celou historii)
+    def _fetch_history(self, ticker: str, start=None) -> pd.DataFrame:
+        # Objekt poskytovatele vzniká pro každé volání zvlášť (nesdílí se mezi vlákny)
+        yahoo_ticker_obj = yf.Ticker(ticker)
+        if start is None:
+            return yahoo_ticker_obj.history(period="max", interval="1d")
 
-    # Rozšířená metoda pro získání informací přes Yahoo Finance
-    def get_info(self, ticker: str):
-        self._yahoo_ticker_obj = yf.Ticker(ticker)
-        return super().get_info(ticker)
-
-    # Stáhne historická data z Yahoo Finance
-    def _download_daily_history(self) -> pd.DataFrame:
-        # Stažení maximální historie
-        stock_history = self._yahoo_ticker_obj.history(period="max", interval="1d")
-
-        # Provedení normalizace
-        stock_history = _normalize_history(stock_history)
-
-        # Uložení do CSV pro budoucí použití
-        file_name = self.get_ticker(self._ticker)
-        stock_history.to_csv(f'../DATA/ASSET_HISTORY/{file_name}.history.csv')
-
-        # Vrátí stažená data
-        return stock_history
+        return yahoo_ticker_obj.history(start=start, interval="1d")
 
     # Stáhne meta informace z Yahoo Finance
-    def _download_stock_info(self) -> dict:
-        # Stažení info slovníku
-        stock_info = self._yahoo_ticker_obj.get_info()
-
-        # Uložení do JSON
-        file_path = f"../DATA/ASSET_INFO/{self._ticker}.info.json"
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(stock_info, f, indent=4)
-
-        # Vrátí stažené informace
-        return stock_info
+    def _download_stock_info(self, ticker: str) -> dict:
+        return yf.Ticker(ticker).get_info()
 
     # Vrátí oficiální symbol tickeru
     def get_ticker(self, ticker: str) -> str:
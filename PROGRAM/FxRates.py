@@ -0,0 +1,152 @@
+import threading
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from Asset import forex_creator, forex_cache
+from DayCalendar import day_calendar
+
+# Měna, přes kterou se dopočítávají křížové kurzy (základní páry jsou vždy PIVOT -> měna)
+PIVOT_CURRENCY = "USD"
+
+
+# ==============================================================================
+# MATICE MĚNOVÝCH KURZŮ
+# ==============================================================================
+
+class FxRateMatrix:
+    def __init__(self, pivot: str = PIVOT_CURRENCY):
+        self._pivot = pivot
+        self._lock = threading.Lock()
+
+        # Verze dat kurzů (zvyšuje se při obnovení historie páru, změně dne nebo zahození načtených párů)
+        self._version = 0
+
+        # Načtené základní páry {měna: denní kurz pivot -> měna} a jejich zdroje {měna: (Forex, verze historie)}
+        self._pairs = {}
+        self._sources = {}
+
+        # Den, ke kterému byla matice sestavena (po změně dne se osa prodlouží)
+        self._built_day = None
+
+        # Denní matice datum x měna (kurzy s doplněnými mezerami a maska skutečných záznamů)
+        self._rates = None
+        self._valid = None
+
+    # ==============================================================================
+    # VNITŘNÍ METODY
+    # ==============================================================================
+
+    # Načte historii základního páru pivot -> měna a zapamatuje si verzi jeho historie
+    def _load_pair(self, currency: str) -> pd.Series:
+        forex = forex_creator(from_currency=self._pivot, to_currency=currency)
+        self._sources[currency] = (forex, forex.get_history_version())
+        prices = forex.get_prices(forex.get_earliest_record_date())
+        return pd.Series(prices["Close"].to_numpy(dtype=np.float64), index=pd.to_datetime(prices.index), name=currency)
+
+    # Sestaví hustou denní matici kurzů ze všech načtených párů
+    def _build_matrix(self):
+        today = pd.Timestamp(datetime.now().date())
+        start = min([pair.index.min() for pair in self._pairs.values()], default=today)
+        dates = day_calendar.get_dates(start).rename('Date')
+
+        # Umístění kurzů každého páru na osu podle posunu dne
+        raw = pd.DataFrame(index=dates)
+        for currency, pair in self._pairs.items():
+            offsets = day_calendar.get_offsets(pair.index, start)
+            on_axis = (offsets >= 0) & (offsets < len(dates))
+            values = np.full(len(dates), np.nan)
+            values[offsets[on_axis]] = pair.to_numpy()[on_axis]
+            raw[currency] = values
+        raw[self._pivot] = 1.0
+
+        self._valid = raw.notna()
+        self._rates = raw.ffill()
+
+    # Zjistí, zda se od sestavení matice změnil den nebo historie některého páru (i novou instancí v cache)
+    def _is_stale(self) -> bool:
+        if self._built_day != datetime.now().date():
+            return True
+
+        for currency, (forex, version) in self._sources.items():
+            cached = forex_cache.peek(f"{self._pivot}{currency}=X")
+            if (cached is not None and cached is not forex) or forex.get_history_version() != version:
+                return True
+        return False
+
+    # Při zastaralé matici znovu načte páry a zvýší verzi (matice se sestaví při dalším použití)
+    def _refresh(self):
+        if self._rates is None or not self._is_stale():
+            return
+
+        for currency in list(self._pairs):
+            self._pairs[currency] = self._load_pair(currency)
+        self._rates = None
+        self._valid = None
+        self._version += 1
+
+    # Zajistí, že matice obsahuje zadané měny (každý pár se načte jen jednou) a je aktuální, a vrátí ji
+    def _get_matrix(self, currencies) -> tuple:
+        with self._lock:
+            self._refresh()
+            missing = [currency for currency in dict.fromkeys(currencies)
+                       if currency != self._pivot and currency not in self._pairs]
+            for currency in missing:
+                self._pairs[currency] = self._load_pair(currency)
+
+            if missing or self._rates is None:
+                self._build_matrix()
+                self._built_day = datetime.now().date()
+
+            return self._rates, self._valid
+
+    # ==============================================================================
+    # VEŘEJNÉ METODY
+    # ==============================================================================
+
+    # Vrátí tickery základních párů potřebných pro převod zadaných měn
+    def get_pair_tickers(self, currencies) -> list:
+        return [f"{self._pivot}{currency}=X" for currency in dict.fromkeys(currencies)
+                if currency != self._pivot and currency not in self._pairs]
+
+    # Vrátí denní kurz from -> to na zadaných dnech (Close) a masku skutečných záznamů (Mask)
+    def get_rates(self, from_currency: str, to_currency: str, dates: pd.DatetimeIndex) -> pd.DataFrame:
+        rates, valid = self._get_matrix([from_currency, to_currency])
+
+        # Řádky matice pro zadané dny podle posunu dne (dny mimo matici zůstanou prázdné)
+        offsets = day_calendar.get_offsets(dates, rates.index[0])
+        on_axis = (offsets >= 0) & (offsets < len(rates))
+        rows = offsets[on_axis]
+
+        # Křížový kurz přes pivotní měnu
+        close = np.full(len(dates), np.nan)
+        close[on_axis] = rates[to_currency].to_numpy()[rows] / rates[from_currency].to_numpy()[rows]
+        mask = np.zeros(len(dates), dtype=bool)
+        mask[on_axis] = valid[to_currency].to_numpy()[rows] & valid[from_currency].to_numpy()[rows]
+
+        df = pd.DataFrame({"Close": close, "Mask": mask}, index=dates)
+
+        # Dny před začátkem historie kurzu dostanou první známý kurz
+        df["Close"] = df["Close"].ffill().bfill()
+
+        return df
+
+    # Vrátí poslední známý kurz from -> to
+    def get_rate(self, from_currency: str, to_currency: str) -> float:
+        rates, _ = self._get_matrix([from_currency, to_currency])
+        return float(rates[to_currency].iloc[-1] / rates[from_currency].iloc[-1])
+
+    # Vrátí verzi dat kurzů (nejdřív ověří, zda se páry nebo den od sestavení matice nezměnily)
+    def get_version(self) -> int:
+        with self._lock:
+            self._refresh()
+            return self._version
+
+    # Zahodí načtené páry (např. po aktualizaci historií kurzů)
+    def clear(self):
+        with self._lock:
+            self._pairs = {}
+            self._sources = {}
+            self._built_day = None
+            self._rates = None
+            self._valid = None
+            self._version += 1
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+
+# ==============================================================================
+# VNITŘNÍ FUNKCE
+# ==============================================================================
+
+# Zarovná masky na společný index a vrátí je jako 2D pole (řádek = maska)
+def _align_masks(masks: tuple, fill_value: bool) -> tuple:
+    # Sjednocení indexů (při shodných indexech bez přepočtu)
+    index = masks[0].index
+    for mask in masks[1:]:
+        if not index.equals(mask.index):
+            index = index.union(mask.index)
+
+    # Převod na booleovskou matici, chybějící dny dostanou neutrální hodnotu
+    values = np.empty((len(masks), len(index)), dtype=bool)
+    for i, mask in enumerate(masks):
+        if not mask.index.equals(index):
+            mask = mask.reindex(index, fill_value=fill_value)
+        values[i] = mask.to_numpy(dtype=bool, na_value=fill_value)
+
+    return index, values
+
+
+# ==============================================================================
+# VEŘEJNÉ FUNKCE PRO PRÁCI S MASKAMI PLATNOSTI DAT
+# ==============================================================================
+
+# Logický AND masek (den je platný, jen pokud je platný ve všech maskách, kde existuje)
+def mask_and(*masks: pd.Series) -> pd.Series:
+    index, values = _align_masks(masks, fill_value=True)
+    return pd.Series(np.logical_and.reduce(values, axis=0), index=index, name=masks[0].name)
+
+
+# Logický OR masek (den je platný, pokud je platný alespoň v jedné masce)
+def mask_or(*masks: pd.Series) -> pd.Series:
+    index, values = _align_masks(masks, fill_value=False)
+    return pd.Series(np.logical_or.reduce(values, axis=0), index=index, name=masks[0].name)
+
+
+# Vrátí první den, kdy je maska platná (nebo None, pokud takový den neexistuje)
+def first_valid_date(mask: pd.Series):
+    values = mask.to_numpy(dtype=bool, na_value=False)
+    if not values.any():
+        return None
+
+    return mask.index[int(np.argmax(values))]
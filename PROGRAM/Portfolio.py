@@ -1,6 +1,8 @@
 from fpdf import FPDF
 from FigiApi import *
 from Position import *
+from ChartRenderer import ChartRenderer
+from PortfolioSnapshot import PortfolioSnapshot
 
 
 # ==============================================================================
@@ -14,6 +16,8 @@ class Portfolio:
         self._name = name
         self._currency = currency
         self._position_dict = {}
+        self._engine = TransactionEngine()
+        self._fx_rates = FxRateMatrix()
         self._portfolio_prices = pd.DataFrame()
         self._first_date = None
 
@@ -23,8 +27,8 @@ class Portfolio:
 
     # Vrátí konkrétní objekt pozice podle tickeru
     def get_position(self, ticker: str):
-        # Vytvoření pomocného objektu assetu pro klíč
-        asset = asset_creator(ticker)
+        # Vytvoření pomocného objektu assetu pro klíč (bez načítání historie)
+        asset = asset_creator(ticker, lazy=True)
 
         # Vrátí nalezenou pozici ze slovníku
         return self._position_dict[asset]
@@ -33,12 +37,16 @@ class Portfolio:
     # SPRÁVA TRANSAKCÍ
     # ==============================================================================
 
+    # Souběžně předem stáhne data aktiv, aby tvorba pozic nečekala na síť po jednom tickeru
+    def prefetch(self, tickers):
+        yfinance_manager.prefetch(tickers)
+
     # Zpracuje novou transakci a přiřadí ji ke správné pozici
     def new_transaction(self, transaction_type: TransactionType, date: datetime, ticker: str,
                         currency: str = None, amount: int = None, price: float = None, venue: str = None):
 
-        # Prvotní vytvoření assetu pro kontrolu burzy
-        current_asset = asset_creator(ticker)
+        # Prvotní vytvoření assetu pro kontrolu burzy (historie se načte až při použití)
+        current_asset = asset_creator(ticker, lazy=True)
 
         # Kontrola, zda sedí burza (případné přemapování přes OpenFIGI)
         if venue is not None and current_asset.get_venue() != venue:
@@ -52,12 +60,12 @@ class Portfolio:
                     print(f"Chyba při mapování FIGI: {e}")
 
         # Finální vytvoření assetu po validaci tickeru
-        final_asset = asset_creator(ticker)
+        final_asset = asset_creator(ticker, lazy=True)
         transaction_date = date.date()
 
         # Pokud pozice pro tento asset neexistuje, vytvoříme ji
         if final_asset not in self._position_dict:
-            self._position_dict[final_asset] = Position(final_asset)
+            self._position_dict[final_asset] = Position(final_asset, self._engine, fx_rates=self._fx_rates)
 
         # Přidání transakce do příslušné pozice
         self._position_dict[final_asset].new_transaction(amount, transaction_date, transaction_type, currency, venue,
@@ -67,19 +75,18 @@ class Portfolio:
     # VNITŘNÍ VÝPOČETNÍ METODY
     # ==============================================================================
 
-    # Identifikuje nejstarší datum transakce napříč všemi pozicemi
-    def _create_first_date(self):
-        # Inicializace datem první nalezené pozice
-        _, first_position = next(iter(self._position_dict.items()))
-        earliest_date = first_position.get_first_date()
+    # Předem souběžně stáhne historie základních měnových párů potřebných pro převod pozic
+    def _prefetch_forex(self):
+        currencies = [asset.get_currency() for asset in self._position_dict if asset.get_currency() != self._currency]
+        if not currencies:
+            return
 
-        # Porovnání se všemi ostatními pozicemi
-        for _, position in self._position_dict.items():
-            if position.get_first_date() < earliest_date:
-                earliest_date = position.get_first_date()
+        forex_tickers = self._fx_rates.get_pair_tickers(currencies + [self._currency])
+        yfinance_manager.prefetch(ticker for ticker in forex_tickers if ticker not in forex_cache)
 
-        # Uložení nejstaršího data do vlastnosti objektu
-        self._first_date = earliest_date
+    # Identifikuje nejstarší datum transakce napříč všemi pozicemi (pozice si své první datum udržují průběžně)
+    def _create_first_date(self):
+        self._first_date = min(position.get_first_date() for position in self._position_dict.values())
 
     # Inicializuje prázdný DataFrame pro ukládání časových řad portfolia
     def _create_portfolio_prices(self):
@@ -103,23 +110,32 @@ class Portfolio:
         self._portfolio_prices.sort_index(inplace=True)
         self._first_date = zero_date
 
-    # Agreguje data ze všech pozic do celkových hodnot portfolia
+    # Agreguje data ze všech pozic do celkových hodnot portfolia jednou redukcí
     def _add_positions(self):
-        for _, position in self._position_dict.items():
-            # Získání časové řady pozice v měně portfolia
-            pos_data = position.get_position(self._currency)
-
-            # Kumulativní součet klíčových finančních sloupců
-            self._portfolio_prices["Base"] = self._portfolio_prices["Base"].add(pos_data["Base"], fill_value=0)
-            self._portfolio_prices["Profit"] = self._portfolio_prices["Profit"].add(pos_data["Profit"], fill_value=0)
-            self._portfolio_prices["Price"] = self._portfolio_prices["Price"].add(pos_data["Price"], fill_value=0)
-
-            # Logické spojení masek platnosti dat
-            self._portfolio_prices["Mask"] = self._portfolio_prices["Mask"].combine(
-                pos_data["Mask"],
-                func=lambda x, y: x & y,
-                fill_value=True
-            )
+        results = [position.get_position(self._currency) for position in self._position_dict.values()]
+        dates = self._portfolio_prices.index
+        columns = ["Base", "Profit", "Price"]
+
+        # Matice pozice x den (mimo dobu pozice chybějící hodnoty a neutrální maska)
+        values = np.full((len(columns), len(results), len(dates)), np.nan)
+        masks = np.ones((len(results), len(dates)), dtype=bool)
+        for i, pos_data in enumerate(results):
+            if pos_data.empty:
+                continue
+
+            # Historie pozice je souvislý výřez denní osy: stačí posun jejího prvního dne
+            start = day_calendar.get_offset(pos_data.index[0], dates[0])
+            end = min(start + len(pos_data), len(dates))
+            for j, column in enumerate(columns):
+                values[j, i, start:end] = pos_data[column].to_numpy()[:end - start]
+            masks[i, start:end] = pos_data["Mask"].to_numpy(dtype=bool)[:end - start]
+
+        # Součet přes pozice (den bez jakékoli hodnoty zůstává prázdný) a logický AND masek
+        sums = np.nansum(values, axis=1)
+        sums[np.isnan(values).all(axis=1)] = np.nan
+        for j, column in enumerate(columns):
+            self._portfolio_prices[column] = sums[j]
+        self._portfolio_prices["Mask"] = masks.all(axis=0)
 
     # Vypočítá index růstu (relativní výkonnost) celého portfolia
     def _calculate_growth(self):
@@ -150,14 +166,45 @@ class Portfolio:
     # VEŘEJNÉ VÝSTUPY (GRAFY, REPORTY)
     # ==============================================================================
 
-    # Kompletně přepočítá historii portfolia a vygeneruje grafy
-    def evaluate_portfolio(self):
+    # Obnoví výsledky pozic ze snímku minulého vyhodnocení (dopočítají se jen nové dny), vrací počet obnovených pozic
+    def _restore_positions(self, snapshot: PortfolioSnapshot) -> int:
+        states = snapshot.load(self._currency)
+        restored = 0
+        for asset, position in self._position_dict.items():
+            state = states.get(asset.get_ticker())
+            if state is not None and position.restore_snapshot_state(self._currency, state):
+                restored += 1
+        return restored
+
+    # Uloží výsledky a stav všech pozic do snímku pro příští vyhodnocení
+    def _save_snapshot(self, snapshot: PortfolioSnapshot):
+        snapshot.save(self._currency, {asset.get_ticker(): position.get_snapshot_state(self._currency)
+                                       for asset, position in self._position_dict.items()})
+
+    # Předá historie všech pozic exportu (zápis probíhá podle nastavení exportu i na pozadí)
+    def _export_positions(self, exporter: PositionExporter):
+        for position in self._position_dict.values():
+            position.export_prices(exporter)
+
+    # Přepočítá historii portfolia a vygeneruje grafy
+    # (exporter = volitelný export historií pozic,
+    #  renderer = sdílená dávka grafů, do které mohou předem přidat grafy i další portfolia a aktiva,
+    #  snapshot = snímek minulého vyhodnocení; přepočítají se jen změněné pozice a u ostatních jen nové dny)
+    def evaluate_portfolio(self, exporter: PositionExporter = None, renderer: ChartRenderer = None,
+                           snapshot: PortfolioSnapshot = None):
 
         # Ukončení pokud je portfolio prázdné
         if not self._position_dict:
             print("V portfoliu ještě neexistují žádné záznamy")
             return
 
+        # Souběžné stažení kurzů všech měn, které bude potřeba převést
+        self._prefetch_forex()
+
+        # Převzetí nezměněných pozic ze snímku
+        if snapshot is not None:
+            self._restore_positions(snapshot)
+
         # Sekvenční provedení všech výpočetních kroků
         self._create_first_date()
         self._create_portfolio_prices()
@@ -165,23 +212,44 @@ class Portfolio:
         self._calculate_growth()
         self._add_record_zero()
 
-        # Generování PNG souborů
-        self.plot_price()
+        # Uložení snímku pro příští (přírůstkové) vyhodnocení
+        if snapshot is not None:
+            self._save_snapshot(snapshot)
+
+        # Volitelný export historií pozic (mimo kritickou cestu výpočtu)
+        if exporter is not None:
+            self._export_positions(exporter)
+
+        # Uložení načtených historií do sdíleného cenového panelu pro rychlejší příští start
+        save_price_panel()
+
+        # Dokončení exportů zapisovaných na pozadí (před spuštěním procesů pro vykreslení grafů)
+        if exporter is not None:
+            exporter.flush()
+
+        # Generování PNG souborů (vykreslí se jen grafy se změněnými daty)
+        renderer = renderer if renderer is not None else ChartRenderer()
+        self.plot_price(renderer)
+        renderer.render()
 
         # Export výpisu portfolia do PDF
         self.export_portfolio_to_pdf()
 
-    # Vygeneruje sadu grafů v čase pro různé metriky
-    def plot_price(self):
-        # Volání externí funkce pro vykreslení růstu, ceny, profitu a báze
-        plot_price(self._portfolio_prices, self._first_date, f"Portfolio {self._name} graf růstu {self._currency}",
-                   "Growth")
-        plot_price(self._portfolio_prices, self._first_date, f"Portfolio {self._name} graf ceny {self._currency}",
-                   "Price")
-        plot_price(self._portfolio_prices, self._first_date, f"Portfolio {self._name} graf profitu {self._currency}",
-                   "Profit")
-        plot_price(self._portfolio_prices, self._first_date, f"Portfolio {self._name} graf báze {self._currency}",
-                   "Base")
+    # Vygeneruje sadu grafů v čase pro různé metriky (s rendererem se grafy jen zařadí do dávky)
+    def plot_price(self, renderer: ChartRenderer = None):
+        charts = [
+            (f"Portfolio {self._name} graf růstu {self._currency}", "Growth"),
+            (f"Portfolio {self._name} graf ceny {self._currency}", "Price"),
+            (f"Portfolio {self._name} graf profitu {self._currency}", "Profit"),
+            (f"Portfolio {self._name} graf báze {self._currency}", "Base"),
+        ]
+
+        # Bez rendereru se grafy vykreslí hned v jedné dávce
+        batch = renderer if renderer is not None else ChartRenderer()
+        for name, column in charts:
+            batch.add(self._portfolio_prices, self._first_date, name, column)
+        if renderer is None:
+            batch.render()
 
     # Exportuje detailní PDF report se stavem pozic, grafy a výkonem p.a.
     def export_portfolio_to_pdf(self):
@@ -0,0 +1,49 @@
+import os
+import pickle
+
+# Výchozí adresář uložených snímků vyhodnocení portfolií
+SNAPSHOT_DIRECTORY = '../DATA/SNAPSHOTS'
+
+# Verze formátu snímku (snímky jiné verze se ignorují)
+SNAPSHOT_FORMAT = 1
+
+
+# ==============================================================================
+# SNÍMEK VYHODNOCENÍ PORTFOLIA
+# ==============================================================================
+
+class PortfolioSnapshot:
+    def __init__(self, name: str, directory: str = SNAPSHOT_DIRECTORY):
+        self._name = name
+        self._directory = directory
+
+    # Vrátí cestu k souboru snímku
+    def get_path(self) -> str:
+        return f"{self._directory}/{self._name}.pkl"
+
+    # Načte stavy pozic uložené pro zadanou měnu (chybějící, poškozený nebo jiný snímek = prázdný slovník)
+    def load(self, currency: str) -> dict:
+        try:
+            with open(self.get_path(), 'rb') as f:
+                snapshot = pickle.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+            print(f"!!! Varování: Snímek portfolia {self._name} nelze načíst, počítám vše znovu: {e}")
+            return {}
+
+        if snapshot.get("format") != SNAPSHOT_FORMAT or snapshot.get("currency") != currency:
+            return {}
+        return snapshot["positions"]
+
+    # Uloží stavy pozic (zápis přes dočasný soubor, aby nevznikl napůl zapsaný snímek)
+    def save(self, currency: str, positions: dict):
+        snapshot = {"format": SNAPSHOT_FORMAT, "currency": currency, "positions": positions}
+        path = self.get_path()
+        try:
+            os.makedirs(self._directory, exist_ok=True)
+            with open(f"{path}.tmp", 'wb') as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(f"{path}.tmp", path)
+        except OSError as e:
+            print(f"!!! Varování: Uložení snímku portfolia {self._name} selhalo: {e}")
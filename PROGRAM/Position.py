@@ -1,6 +1,15 @@
+import hashlib
 from collections import deque
 from Transaction import *
 from DownloadManager import get_last_business_day
+from MaskAlgebra import mask_and
+from FxRates import FxRateMatrix
+from PositionExport import PositionExporter, content_hash
+
+# Dostupné způsoby agregace transakcí do historie pozice
+# engine - jeden průchod sloupcovým úložištěm, stack - matice transakcí a NumPy redukce,
+# loop - původní postupné sčítání Series (referenční implementace)
+AGGREGATION_BACKENDS = ("engine", "stack", "loop")
 
 
 # ==============================================================================
@@ -8,10 +17,15 @@ from DownloadManager import get_last_business_day
 # ==============================================================================
 
 class Position:
-    def __init__(self, asset: Asset):
+    def __init__(self, asset: Asset, engine: TransactionEngine = None, aggregation: str = "engine",
+                 fx_rates: FxRateMatrix = None):
         # Základní atributy aktiva
         self._asset = asset
         self._transaction_list = []
+        self._engine = engine if engine is not None else TransactionEngine()
+        self._fx_rates = fx_rates if fx_rates is not None else FxRateMatrix()
+        self._aggregation = None
+        self.set_aggregation(aggregation)
         self._currency = self._asset.get_currency()
         self._venue = self._asset.get_venue()
 
@@ -19,13 +33,19 @@ class Position:
         self._amount = 0
         self._realized_pnl = 0
         self._break_even_point = None
-        self._prices_calculated = False
+
+        # Otisk množiny transakcí a mezipaměti výsledků (základ v měně aktiva a výsledky podle cílové měny)
+        self._fingerprint = 0
+        self._native_result = None
+        self._results = {}
+
+        # Stav posledního dne výsledků podle měny (báze, cena v měně aktiva, realizovaný zisk, BEP) pro snímek
+        self._result_states = {}
 
         # Dataframe a časové řady
         self._position_prices = None
         self._dates = None
         self._first_date = None
-        self._forex = None
 
     # ==============================================================================
     # VNITŘNÍ METODY PRO VÝPOČTY (NORMALIZACE A LOGIKA)
@@ -33,6 +53,9 @@ class Position:
 
     # Vypočítá realizovaný zisk a Break Even Point pomocí metody FIFO
     def _calculate_bz(self):
+        # Výchozí stav (u uzavřené pozice zůstává realizovaný zisk nulový)
+        self._realized_pnl = 0
+
         # Seřazení transakcí podle data
         dated_transactions = {t.get_date(): t for t in self._transaction_list}
         sorted_transactions = sorted(dated_transactions.items(), key=lambda x: x[1].get_date())
@@ -79,24 +102,65 @@ class Position:
         self._realized_pnl = realized_profit
         self._break_even_point = full_price / full_amount
 
-    # Určí datum první transakce pro inicializaci časové řady
-    def _create_first_date(self):
-        # Nalezení nejstaršího data v seznamu transakcí
-        first_date = self._transaction_list[0].get_date()
-        for transaction in self._transaction_list:
-            if transaction.get_date() < first_date:
-                first_date = transaction.get_date()
-
-        self._first_date = first_date
-        self._dates = pd.date_range(start=self._first_date, end=datetime.now().date(), freq='D')
+    # Připraví denní osu pozice od první transakce do dneška (výřez sdíleného kalendáře)
+    def _create_dates(self):
+        self._dates = day_calendar.get_dates(self._first_date)
 
     # Inicializuje prázdný DataFrame pro ukládání cenové historie pozice
     def _create_position_prices(self):
         # Vytvoření dataframe na základě počátečního data
         self._position_prices = create_dataframe_from_date(self._first_date)
 
-    # Kumulativně sečte hodnoty ze všech transakcí do historie pozice
+    # Sečte hodnoty ze všech transakcí do historie pozice zvoleným způsobem agregace
     def _add_transactions(self):
+        if self._aggregation == "loop":
+            self._add_transactions_loop()
+        elif self._aggregation == "stack":
+            self._add_transactions_stacked()
+        else:
+            self._add_transactions_engine()
+
+        # Výpočet průběžného zisku
+        self._position_prices["Profit"] = self._position_prices["Price"] - self._position_prices["Base"]
+
+    # Agregace jedním vektorizovaným průchodem sloupcovým úložištěm
+    def _add_transactions_engine(self):
+        # Schodová funkce držby vynásobená cenovým vývojem aktiva
+        asset_prices = self._engine.asset_frame(self._asset)
+
+        # Převzetí základních finančních sloupců a masky platnosti dat
+        self._position_prices["Base"] = asset_prices["Base"]
+        self._position_prices["Price"] = asset_prices["Price"]
+        self._position_prices["Mask"] = asset_prices["Mask"]
+
+    # Agregace poskládáním všech transakcí na společnou osu a redukcí přes NumPy
+    def _add_transactions_stacked(self):
+        # Společná denní osa pozice
+        dates = self._position_prices.index
+        count = len(self._transaction_list)
+
+        # Matice transakcí (řádek = transakce, sloupec = den), mimo dobu transakce neutrální hodnoty
+        base = np.zeros((count, len(dates)))
+        price = np.zeros((count, len(dates)))
+        mask = np.ones((count, len(dates)), dtype=bool)
+
+        # Jednorázové umístění každé transakce na osu podle posunu jejího prvního dne
+        for i, transaction in enumerate(self._transaction_list):
+            transaction_prices = transaction.get_transaction()
+            start = dates.get_loc(transaction_prices.index[0])
+            end = start + len(transaction_prices)
+
+            base[i, start:end] = transaction_prices["Base"].to_numpy()
+            price[i, start:end] = transaction_prices["Price"].to_numpy()
+            mask[i, start:end] = transaction_prices["Mask"].to_numpy()
+
+        # Redukce přes všechny transakce najednou
+        self._position_prices["Base"] = base.sum(axis=0)
+        self._position_prices["Price"] = price.sum(axis=0)
+        self._position_prices["Mask"] = mask.all(axis=0)
+
+    # Agregace postupným sčítáním jednotlivých transakcí (původní referenční postup)
+    def _add_transactions_loop(self):
         # Procházení všech transakcí a sčítání jejich vlivu na pozici
         for transaction in self._transaction_list:
             transaction_prices = transaction.get_transaction()
@@ -107,14 +171,7 @@ class Position:
                                                                                 fill_value=0)
 
             # Aktualizace masky platnosti dat (logický AND)
-            self._position_prices["Mask"] = self._position_prices["Mask"].combine(
-                transaction_prices["Mask"],
-                func=lambda x, y: x & y,
-                fill_value=True
-            )
-
-        # Výpočet průběžného zisku
-        self._position_prices["Profit"] = self._position_prices["Price"] - self._position_prices["Base"]
+            self._position_prices["Mask"] = mask_and(self._position_prices["Mask"], transaction_prices["Mask"])
 
     # Vypočítá procentuální růst pozice (Growth faktor)
     def _calculate_growth(self):
@@ -123,40 +180,131 @@ class Position:
 
     # Provede měnovou konverzi celé historie pozice
     def _currency_exchange(self, target_currency: str):
-        # Inicializace forexového převodníku
-        self._forex = forex_creator(from_currency=self._currency, to_currency=target_currency)
-        forex_prices = self._forex.get_prices(self._first_date)
+        # Denní kurzy z matice kurzů rovnou na datové ose pozice
+        forex_prices = self._fx_rates.get_rates(self._currency, target_currency, self._dates)
 
         # Převod realizovaného zisku aktuálním kurzem
-        rate = self._forex.get_rate()
+        rate = self._fx_rates.get_rate(self._currency, target_currency)
         self._realized_pnl *= rate
 
-        # Sjednocení časové řady forexu s daty pozice
-        forex_prices = forex_prices.reindex(self._dates)
-        forex_prices["Mask"] = forex_prices["Close"].notna()
-        forex_prices["Close"] = forex_prices["Close"].ffill().bfill()
+        # Dny transakcí na ose pozice (posun od prvního dne) a jejich historické kurzy
+        positions = day_calendar.get_offsets([t.get_date() for t in self._transaction_list], self._dates[0])
+        historical_rates = forex_prices["Close"].to_numpy()[positions]
 
-        # Přepočet nákupní základny (Base) historickými kurzy v dnech transakcí
-        self._position_prices["Base"] = np.nan
-        for transaction in self._transaction_list:
-            date = pd.to_datetime(transaction.get_date())
-            base_value = transaction.get_base()
-            historical_rate = forex_prices.loc[date, "Close"]
-            self._position_prices["Base"] = self._position_prices["Base"].add(base_value * historical_rate,
-                                                                              fill_value=0)
+        # Přepočet nákupní základny (Base): přírůstky báze v nové měně v dnech transakcí a jejich kumulativní součet
+        bases = np.array([t.get_amount() * t.get_price() for t in self._transaction_list], dtype=np.float64)
+        base_events = np.zeros(len(self._dates))
+        np.add.at(base_events, positions, bases * historical_rates)
+        self._position_prices["Base"] = np.cumsum(base_events)
 
         # Přepočet tržní ceny a zisku novým kurzem
         self._position_prices["Price"] = self._position_prices["Price"] * forex_prices["Close"]
         self._position_prices["Profit"] = self._position_prices["Price"] - self._position_prices["Base"]
 
         # Aktualizace masky o platnost dat forexu
-        self._position_prices["Mask"] = self._position_prices["Mask"].combine(
-            forex_prices["Mask"],
-            func=lambda x, y: x & y,
-            fill_value=True
-        )
+        self._position_prices["Mask"] = mask_and(self._position_prices["Mask"], forex_prices["Mask"])
+
+    # Vrátí verzi cenových dat, ze kterých výsledek vychází (historie aktiva, kurzy a poslední den osy)
+    def _get_price_version(self) -> tuple:
+        return self._asset.get_history_version(), self._fx_rates.get_version(), day_calendar.get_today()
+
+    # Vrátí historii pozice v měně aktiva (společný základ všech měn, počítá se jen po změně nebo s novým dnem)
+    def _get_native_result(self) -> tuple:
+        key = (self._fingerprint, self._asset.get_history_version(), day_calendar.get_today())
+        if self._native_result is None or self._native_result[0] != key:
+            self._create_dates()
+            self._create_position_prices()
+            self._add_transactions()
+            self._calculate_bz()
+            self._native_result = (key, self._position_prices, self._realized_pnl)
 
-        self._currency = target_currency
+        return self._native_result[1], self._native_result[2]
+
+    # Spočítá kompletní výsledek pozice v zadané měně
+    def _calculate_result(self, currency: str) -> tuple:
+        native_prices, native_realized_pnl = self._get_native_result()
+        self._position_prices = native_prices.copy()
+        self._realized_pnl = native_realized_pnl
+
+        # Případná měnová konverze do požadované měny
+        if self._currency != currency:
+            self._currency_exchange(currency)
+
+        # Stav posledního dne před vyčištěním (výchozí bod pro pozdější dopočet nových dnů)
+        self._result_states[currency] = {
+            "base": float(self._position_prices["Base"].iloc[-1]),
+            "native_price": float(native_prices["Price"].iloc[-1]),
+            "realized": native_realized_pnl,
+            "break_even": self._break_even_point,
+        }
+
+        # Finalizace dat
+        self._calculate_growth()
+        self._clean_position_data()
+
+        return self._position_prices, self._realized_pnl
+
+    # Spočítá otisk vstupních cenových dat (historie aktiva a kurzy) od první transakce do zadaného dne
+    def _get_input_digest(self, currency: str, last_day: pd.Timestamp) -> str:
+        history = self._asset.get_prices(self._first_date)
+        end = AsofIndex(history.index).locate(last_day) + 1
+        digest = hashlib.sha1(content_hash(history.iloc[:end][["Close", "return"]]).encode("utf-8"))
+
+        # Kurzy jen u pozic převáděných do jiné měny
+        if self._currency != currency:
+            dates = self._dates[self._dates <= last_day]
+            digest.update(content_hash(self._fx_rates.get_rates(self._currency, currency, dates)).encode("utf-8"))
+
+        return digest.hexdigest()
+
+    # Prodlouží uložený výsledek o dny po jeho posledním dni (bez nových transakcí roste hodnota s cenou aktiva)
+    def _extend_result(self, currency: str, prices: pd.DataFrame, state: dict) -> pd.DataFrame:
+        last_day = prices.index[-1]
+        dates = self._dates[self._dates > last_day]
+        if len(dates) == 0:
+            return prices
+
+        # Denní výnosy a platnost záznamů historie na nových dnech (dny bez záznamu = beze změny ceny)
+        history = self._asset.get_prices(last_day.date())
+        history_days = pd.to_datetime(history.index)
+        on_tail = (history_days > last_day) & (history_days <= dates[-1])
+        offsets = day_calendar.get_offsets(history_days[on_tail], dates[0])
+
+        returns = np.zeros(len(dates))
+        returns[offsets] = history["return"].to_numpy(dtype=np.float64)[on_tail]
+        returns = np.nan_to_num(returns, nan=0.0)
+        mask = np.zeros(len(dates), dtype=bool)
+        mask[offsets] = ~np.isnan(history["Close"].to_numpy(dtype=np.float64)[on_tail])
+
+        native_price = state["native_price"] * np.cumprod(returns + 1)
+        state["native_price"] = float(native_price[-1])
+
+        # Převod nových dnů kurzem (báze se bez transakcí nemění)
+        tail = pd.DataFrame(index=dates.rename("Date"))
+        tail["Base"] = state["base"]
+        tail["Profit"] = np.nan
+        tail["Price"] = native_price
+        tail["Growth"] = np.nan
+        tail["Mask"] = mask
+        if self._currency != currency:
+            forex_prices = self._fx_rates.get_rates(self._currency, currency, dates)
+            tail["Price"] = tail["Price"] * forex_prices["Close"]
+            tail["Mask"] = tail["Mask"] & forex_prices["Mask"]
+        tail["Profit"] = tail["Price"] - tail["Base"]
+        tail["Growth"] = tail["Price"] / tail["Base"]
+
+        # Stejné čištění jako u kompletního výpočtu (růst uzavřené pozice navazuje na uložený výsledek)
+        invalid_mask = tail["Price"].abs() < 0.0001
+        tail.loc[invalid_mask, ["Base", "Price"]] = 0
+        tail["Growth"] = tail["Growth"].where(~invalid_mask).ffill().fillna(prices["Growth"].iloc[-1])
+
+        return pd.concat([prices, tail])
+
+    # Zahodí všechny uložené výsledky
+    def _invalidate_results(self):
+        self._native_result = None
+        self._results = {}
+        self._result_states = {}
 
     # Vyčistí data v případě, že je pozice uzavřena (vynulována)
     def _clean_position_data(self):
@@ -195,23 +343,40 @@ class Position:
                                           date=date,
                                           amount=amount,
                                           price=price,
-                                          amount_owned=self._amount)
+                                          amount_owned=self._amount,
+                                          engine=self._engine)
 
         elif transaction_type == TransactionType.FRACTION_LONG:
             transaction = LongFractionTransaction(asset=self._asset,
                                                   date=date,
                                                   amount=amount,
                                                   price=price,
-                                                  amount_owned=self._amount)
+                                                  amount_owned=self._amount,
+                                                  engine=self._engine)
 
         # Uložení transakce a aktualizace celkového množství
         self._transaction_list.append(transaction)
         self._amount += transaction.get_amount()
-        self._prices_calculated = False
+
+        # Průběžné udržování data první transakce (bez procházení všech transakcí)
+        if self._first_date is None or transaction.get_date() < self._first_date:
+            self._first_date = transaction.get_date()
+
+        # Nový otisk množiny transakcí zneplatní uložené výsledky
+        self._fingerprint = hash((self._fingerprint, transaction.get_date(), transaction.get_amount(),
+                                  transaction.get_price()))
+        self._invalidate_results()
+
+    # Nastaví způsob agregace transakcí (viz AGGREGATION_BACKENDS)
+    def set_aggregation(self, aggregation: str):
+        if aggregation not in AGGREGATION_BACKENDS:
+            raise ValueError(f"Neznámý způsob agregace '{aggregation}', dostupné: {', '.join(AGGREGATION_BACKENDS)}")
+
+        self._aggregation = aggregation
+        self._invalidate_results()
 
     # Vrátí datum první transakce v této pozici
     def get_first_date(self) -> datetime:
-        self._create_first_date()
         return self._first_date
 
     # Vrátí aktuální přehled o stavu pozice (poslední známé hodnoty)
@@ -240,28 +405,61 @@ class Position:
         return (name, currency, price, growth, profit, self._break_even_point,
                 self._amount, current_market_price, ticker, realized_profit)
 
-    # Provede kompletní výpočet historie pozice a vrátí DataFrame
+    # Provede kompletní výpočet historie pozice a vrátí DataFrame (výsledky jsou uložené pro každou měnu)
     def get_position(self, currency: str) -> pd.DataFrame:
-        # Prvotní výpočet historie, pokud ještě neproběhl
-        if not self._prices_calculated:
-            self._create_first_date()
-            self._create_position_prices()
-            self._add_transactions()
-
-        # Výpočet FIFO statistik
-        self._calculate_bz()
-
-        # Případná měnová konverze do požadované měny
-        if not (self._currency == currency):
-            self._currency_exchange(currency)
+        # Výsledek je platný jen pro stejné transakce a stejná cenová data
+        key = (self._fingerprint, self._get_price_version())
+        cached = self._results.get(currency)
+        if cached is None or cached[0] != key:
+            cached = (key, self._calculate_result(currency))
+            self._results[currency] = cached
 
-        # Finalizace dat
-        self._calculate_growth()
-        self._prices_calculated = True
-        self._clean_position_data()
+        # Naposledy vyžádaný výsledek slouží i pro get_last_value
+        self._position_prices, self._realized_pnl = cached[1]
 
-        # Export do CSV pro archivaci
-        file_name = self._asset.get_name()
-        self._position_prices.to_csv(f'../DATA/POSITION_PRICES/{file_name}.history.csv')
+        return self._position_prices
 
-        return self._position_prices
\ No newline at end of file
+    # Vrátí stabilní otisk množiny transakcí (stejný i v dalším běhu programu)
+    def get_transactions_digest(self) -> str:
+        digest = hashlib.sha1()
+        for transaction in self._transaction_list:
+            digest.update(f"{transaction.get_date()}|{transaction.get_amount()!r}|{transaction.get_price()!r};"
+                          .encode("utf-8"))
+        return digest.hexdigest()
+
+    # Vrátí stav výsledku v zadané měně pro uložení do snímku (historie a stav posledního dne)
+    def get_snapshot_state(self, currency: str) -> dict:
+        prices = self.get_position(currency)
+        return {
+            "transactions": self.get_transactions_digest(),
+            "inputs": self._get_input_digest(currency, prices.index[-1]),
+            "prices": prices,
+            **self._result_states[currency],
+        }
+
+    # Obnoví výsledek ze snímku a dopočítá jen nové dny (vrací False, pokud se transakce nebo data změnily)
+    def restore_snapshot_state(self, currency: str, state: dict) -> bool:
+        if state["transactions"] != self.get_transactions_digest():
+            return False
+
+        self._create_dates()
+        prices = state["prices"]
+        if prices.index[0] != self._dates[0] or state["inputs"] != self._get_input_digest(currency, prices.index[-1]):
+            return False
+
+        # Dopočet nových dnů a realizovaný zisk převedený aktuálním kurzem
+        state = {key: state[key] for key in ("base", "native_price", "realized", "break_even")}
+        prices = self._extend_result(currency, prices, state)
+        realized_pnl = state["realized"]
+        if self._currency != currency:
+            realized_pnl *= self._fx_rates.get_rate(self._currency, currency)
+
+        # Uložení jako platný výsledek pro aktuální transakce a cenová data
+        self._break_even_point = state["break_even"]
+        self._result_states[currency] = state
+        self._results[currency] = ((self._fingerprint, self._get_price_version()), (prices, realized_pnl))
+        return True
+
+    # Předá naposledy vypočtenou historii pozice exportu pro archivaci
+    def export_prices(self, exporter: PositionExporter) -> bool:
+        return exporter.export(self._asset.get_name(), self._position_prices)
\ No newline at end of file
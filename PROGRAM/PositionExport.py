@@ -0,0 +1,125 @@
+import os
+import queue
+import hashlib
+import threading
+import pandas as pd
+from DownloadManager import create_history_storage
+
+# Výchozí adresář exportovaných historií pozic
+POSITION_PRICES_DIRECTORY = '../DATA/POSITION_PRICES'
+
+
+# ==============================================================================
+# POMOCNÉ FUNKCE
+# ==============================================================================
+
+# Spočítá otisk obsahu DataFrame (index, názvy sloupců i hodnoty)
+def content_hash(df: pd.DataFrame) -> str:
+    digest = hashlib.sha1(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    digest.update(",".join(map(str, df.columns)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+# ==============================================================================
+# EXPORT HISTORIÍ POZIC
+# ==============================================================================
+
+class PositionExporter:
+    def __init__(self, export_format: str = "csv", directory: str = POSITION_PRICES_DIRECTORY,
+                 background: bool = True):
+        # Úložiště v požadovaném formátu (csv, parquet, feather)
+        self._storage = create_history_storage(export_format, directory)
+        self._background = background
+
+        # Otisky naposledy zapsaného obsahu a obsahu čekajícího na zápis podle názvu souboru
+        self._hashes = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+        # Fronta zápisů a vlákno, které je zpracovává na pozadí
+        self._queue = queue.Queue()
+        self._worker = None
+
+    # ==============================================================================
+    # VNITŘNÍ METODY
+    # ==============================================================================
+
+    # Vrátí cestu k souboru s otiskem exportovaného obsahu
+    def _get_hash_path(self, name: str) -> str:
+        return f"{self._storage.get_path(name)}.sha1"
+
+    # Vrátí otisk čekajícího nebo posledního zápisu (z paměti, případně ze souboru vedle exportu z minulého běhu)
+    def _get_last_hash(self, name: str) -> str:
+        if name in self._pending:
+            return self._pending[name]
+        if name not in self._hashes and os.path.exists(self._storage.get_path(name)):
+            try:
+                with open(self._get_hash_path(name), 'r', encoding='utf-8') as f:
+                    self._hashes[name] = f.read().strip()
+            except FileNotFoundError:
+                pass
+        return self._hashes.get(name)
+
+    # Zapíše historii pozice a její otisk (otisk se zapamatuje až po úspěšném zápisu)
+    def _write(self, name: str, df: pd.DataFrame, digest: str):
+        try:
+            self._storage.save(name, df)
+            with open(self._get_hash_path(name), 'w', encoding='utf-8') as f:
+                f.write(digest)
+        except Exception as e:
+            print(f"!!! Varování: Export historie pozice {name} selhal: {e}")
+
+            # Neúspěšný zápis se při dalším exportu zopakuje
+            with self._lock:
+                self._hashes.pop(name, None)
+                if self._pending.get(name) == digest:
+                    del self._pending[name]
+            return
+
+        with self._lock:
+            self._hashes[name] = digest
+            if self._pending.get(name) == digest:
+                del self._pending[name]
+
+    # Smyčka vlákna na pozadí: postupně zapisuje exporty z fronty (žádná chyba zápisu vlákno neukončí)
+    def _run(self):
+        while True:
+            name, df, digest = self._queue.get()
+            try:
+                self._write(name, df, digest)
+            except Exception as e:
+                print(f"!!! Varování: Export historie pozice {name} selhal: {e}")
+            finally:
+                self._queue.task_done()
+
+    # Spustí vlákno pro zápis na pozadí (poprvé, nebo znovu, pokud předchozí vlákno skončilo)
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="PositionExporter", daemon=True)
+                self._worker.start()
+
+    # ==============================================================================
+    # VEŘEJNÉ METODY
+    # ==============================================================================
+
+    # Exportuje historii pozice, pokud se její obsah od posledního zápisu změnil (vrací, zda se zapisuje)
+    def export(self, name: str, df: pd.DataFrame) -> bool:
+        digest = content_hash(df)
+        with self._lock:
+            if self._get_last_hash(name) == digest:
+                return False
+            self._pending[name] = digest
+
+        if self._background:
+            self._ensure_worker()
+            self._queue.put((name, df, digest))
+        else:
+            self._write(name, df, digest)
+        return True
+
+    # Počká na dokončení všech zápisů ve frontě (zbylé zápisy po skončeném vlákně převezme nové)
+    def flush(self):
+        if self._queue.unfinished_tasks:
+            self._ensure_worker()
+        self._queue.join()
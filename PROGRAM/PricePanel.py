@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import uuid
+import numpy as np
+import pandas as pd
+
+# ==============================================================================
+# KONFIGURACE CENOVÉHO PANELU
+# ==============================================================================
+
+# Adresář panelu a sloupce, které panel uchovává
+PANEL_DIRECTORY = '../DATA/PRICE_PANEL'
+PANEL_COLUMNS = ["Close", "High", "Low", "return"]
+
+
+# ==============================================================================
+# SESTAVENÍ PANELU NA DISKU
+# ==============================================================================
+
+# Vrátí cestu k poli panelu dané generace (None = panel z doby před generacemi)
+def _get_array_path(directory: str, generation: str, name: str) -> str:
+    if generation is None:
+        return f"{directory}/panel.{name}.npy"
+    return f"{directory}/panel.{generation}.{name}.npy"
+
+
+# Vytvoří název nové generace (řadí se podle času vzniku, náhodná přípona odliší souběžné procesy)
+def _new_generation() -> str:
+    return f"{time.time_ns():016x}{uuid.uuid4().hex[:6]}"
+
+
+# Vrátí generaci, do které patří soubor pole panelu ('' = panel z doby před generacemi, None = jiný soubor)
+def _get_file_generation(filename: str) -> str:
+    parts = filename.split(".")
+    if parts[0] != "panel" or parts[-1] != "npy" or parts[-2] not in ("values", "dates"):
+        return None
+    return parts[1] if len(parts) == 4 else ""
+
+
+# Načte index panelu (None, pokud panel ještě neexistuje)
+def _read_index(directory: str) -> dict:
+    try:
+        with open(f"{directory}/panel.index.json", 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+# Namapuje aktuální generaci panelu (index, hodnoty, data); pole smazaná mezi čtením indexu a mapováním
+# znamenají novější index, proto se index načte znovu (jednou), teprve pak se chyba předá dál
+def _map_generation(directory: str) -> tuple:
+    for attempt in range(2):
+        panel_index = _read_index(directory)
+        if panel_index is None:
+            return None, None, None
+        generation = panel_index.get("generation")
+        try:
+            values = np.load(_get_array_path(directory, generation, "values"), mmap_mode='r')
+            dates = np.load(_get_array_path(directory, generation, "dates"), mmap_mode='r')
+            return panel_index, values, dates
+        except FileNotFoundError:
+            if attempt == 1:
+                raise
+
+
+# Smaže generace panelu starší než předchozí generace (aktuální a předchozí zůstávají pro čtenáře,
+# kteří ještě mapují starší index, a novější generace mohou patřit jinému, právě zapisujícímu procesu)
+def remove_stale_generations(directory: str = PANEL_DIRECTORY):
+    try:
+        panel_index = _read_index(directory)
+    except json.JSONDecodeError:
+        return
+    if panel_index is None or panel_index.get("previous") is None:
+        return
+
+    for filename in os.listdir(directory):
+        generation = _get_file_generation(filename)
+        if generation is not None and generation < panel_index["previous"]:
+            try:
+                os.remove(f"{directory}/{filename}")
+            except OSError:
+                # Soubor stále namapovaný jiným procesem (Windows) se smaže při některé z dalších přestaveb
+                pass
+
+
+# Zapíše historie {ticker: DataFrame} do nové generace panelu; ostatní tickery převezme z aktuální generace
+def build_price_panel(histories: dict, directory: str = PANEL_DIRECTORY) -> "PricePanel":
+    panel_index, current_values, current_dates = _map_generation(directory)
+    current_tickers = panel_index["tickers"] if panel_index is not None else {}
+
+    index = {}
+    values = []
+    dates = []
+    row = 0
+
+    # Nezměněné tickery se zkopírují jako bloky řádků aktuální generace
+    for ticker, (start, end) in current_tickers.items():
+        if ticker in histories:
+            continue
+        values.append(current_values[start:end])
+        dates.append(current_dates[start:end])
+        index[ticker] = [row, row + end - start]
+        row += end - start
+
+    # Změněné tickery se připojí na konec (záznamy každého aktiva leží za sebou, bez prázdných řádků)
+    for ticker, history in histories.items():
+        if history.empty:
+            continue
+
+        history = history.sort_index()
+        values.append(history.reindex(columns=PANEL_COLUMNS).to_numpy(dtype=np.float64))
+        dates.append(pd.to_datetime(history.index).values.astype("datetime64[D]"))
+
+        index[ticker] = [row, row + len(history)]
+        row += len(history)
+
+    # Každá přestavba zapíše pole nové generace do nových souborů (namapované staré soubory se nepřepisují)
+    generation = _new_generation()
+    os.makedirs(directory, exist_ok=True)
+    np.save(_get_array_path(directory, generation, "values"),
+            np.concatenate(values) if values else np.empty((0, len(PANEL_COLUMNS))))
+    np.save(_get_array_path(directory, generation, "dates"),
+            np.concatenate(dates) if dates else np.empty(0, dtype="datetime64[D]"))
+
+    # Index se zveřejní až nakonec a atomicky (čtenář vždy dostane index i pole stejné generace)
+    index_path = f"{directory}/panel.index.json"
+    previous = panel_index.get("generation", "") if panel_index is not None else None
+    with open(f"{index_path}.{generation}.tmp", 'w', encoding='utf-8') as f:
+        json.dump({"generation": generation, "previous": previous, "columns": PANEL_COLUMNS, "tickers": index},
+                  f, indent=4)
+    os.replace(f"{index_path}.{generation}.tmp", index_path)
+
+    return PricePanel(directory)
+
+
+# ==============================================================================
+# PAMĚŤOVĚ MAPOVANÝ PANEL CEN
+# ==============================================================================
+
+class PricePanel:
+    def __init__(self, directory: str = PANEL_DIRECTORY):
+        self._directory = directory
+        self._values = None
+        self._dates = None
+        self._index = {}
+        self._open()
+
+    # Namapuje soubory panelu do paměti (bez načítání dat, stránky sdílí všechny procesy)
+    def _open(self):
+        try:
+            panel_index, values, dates = _map_generation(self._directory)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            # Nečitelný panel: zůstává dosavadní mapování (na začátku prázdný panel), panel na disku se nemění
+            print(f"!!! Varování: Cenový panel nelze namapovat: {e}")
+            return
+
+        if panel_index is None:
+            # Panel zatím neexistuje -> prázdný panel
+            self._values, self._dates, self._index = None, None, {}
+            return
+        self._values, self._dates, self._index = values, dates, panel_index["tickers"]
+
+    # Znovu namapuje panel (např. po jeho přestavbě), mapování staré generace se uvolní
+    def reload(self):
+        self._open()
+
+    # Zjistí, zda panel obsahuje historii daného tickeru
+    def __contains__(self, ticker: str) -> bool:
+        return ticker in self._index
+
+    # Vrátí seznam tickerů uložených v panelu
+    def get_tickers(self) -> list:
+        return list(self._index)
+
+    # Vrátí datum posledního záznamu tickeru v panelu
+    def get_last_record_date(self, ticker: str):
+        _, end = self._index[ticker]
+        return pd.Timestamp(self._dates[end - 1]).date()
+
+    # Vrátí datum prvního záznamu tickeru v panelu
+    def get_earliest_record_date(self, ticker: str):
+        start, _ = self._index[ticker]
+        return pd.Timestamp(self._dates[start]).date()
+
+    # Vrátí historii tickeru jako DataFrame nad namapovanými daty (bez kopie, pouze pro čtení)
+    def get_history(self, ticker: str) -> pd.DataFrame:
+        start, end = self._index[ticker]
+
+        # Index ve formátu zbytku programu (čistá data)
+        dates = pd.to_datetime(self._dates[start:end]).date
+
+        history = pd.DataFrame(self._values[start:end], index=dates, columns=PANEL_COLUMNS, copy=False)
+        return history
@@ -4,6 +4,7 @@ from datetime import datetime
 from enum import IntEnum
 from typing import Tuple
 from Asset import *
+from TransactionEngine import TransactionEngine
 
 
 # ==============================================================================
@@ -21,7 +22,7 @@ class TransactionType(IntEnum):
 
 class Transaction:
     def __init__(self, asset: Asset, date: datetime, amount_owned: float,
-                 amount: int = None, price: float = None):
+                 amount: int = None, price: float = None, engine: TransactionEngine = None):
 
         # Základní atributy transakce
         self._asset = asset
@@ -30,8 +31,9 @@ class Transaction:
         self._amount = amount
         self._price = price
 
-        # Inicializace výsledného dataframe a stavu
-        self._transaction_prices = create_dataframe_from_date(self._date)
+        # Sloupcové úložiště, nad kterým je transakce jen pohledem
+        self._engine = engine if engine is not None else TransactionEngine()
+        self._row = None
         self._terminate_position = False
 
         # 1. Nastavení specifických parametrů dle typu transakce
@@ -41,12 +43,8 @@ class Transaction:
         self._check_transaction()
         self._check_amount(amount_owned)
 
-        # 3. Výpočet finančních ukazatelů časové řady
-        self._create_base()
-        self._create_change()
-        self._create_profit()
-        self._create_price()
-        self._create_mask()
+        # 3. Uložení transakce do sloupcového úložiště (historie se počítá až na vyžádání)
+        self._row = self._engine.add_transaction(self._asset, self._date, self._amount, self._price)
 
     # ==============================================================================
     # VNITŘNÍ METODY PRO NASTAVENÍ A VALIDACI
@@ -56,29 +54,21 @@ class Transaction:
     def _set_parameters(self):
         pass
 
-    # Načte cenovou historii aktiva a připraví pomocné proměnné
+    # Načte z historie aktiva záznamy potřebné pro transakci
     def _get_history(self):
-        # Generování rozsahu dat od transakce do dneška
-        self._dates = pd.date_range(start=self._date, end=datetime.now().date(), freq='D')
-
-        # Získání cenových dat z objektu aktiva
-        self._history = self._asset.get_prices(self._date)
         self._first_record_date = self._asset.get_earliest_record_date()
         self._record_to_date = self._get_record_to_date()
 
     # Vrátí záznam ceny nejbližší datu transakce
-    def _get_record_to_date(self) -> pd.DataFrame:
-        # Vyhledání nejbližšího předchozího nebo shodného záznamu
-        nearest_row = self._history.index.asof(self._date)
+    def _get_record_to_date(self) -> pd.Series:
+        # Vyhledání nejbližšího předchozího nebo shodného záznamu přes index aktiva
+        record = self._asset.get_record(self._date)
 
-        # Pokud záznam neexistuje, zkusíme reindexaci časové řady
-        if pd.isna(nearest_row):
-            self._history = self._history.reindex(self._dates)
-            self._history.index = self._history.index.date
-            return self._get_record_to_date()
+        # Pokud datum předchází historii, vrátí se prázdný záznam
+        if record is None:
+            return pd.Series(np.nan, index=self._asset.get_first_record().index)
 
-        # Vrátí nalezený řádek historie
-        return self._history.loc[nearest_row]
+        return record
 
     # Prověří, zda transakce proběhla v platném čase a za reálnou cenu
     def _check_transaction(self):
@@ -89,7 +79,7 @@ class Transaction:
 
             # Pokud nebyla zadána cena, použijeme první dostupnou zavírací cenu
             if self._price is None:
-                self._price = self._history.loc[self._first_record_date, "Close"]
+                self._price = self._asset.get_first_record()["Close"]
         else:
             # Pokud nebyla zadána cena, použijeme zavírací cenu daného dne
             if self._price is None:
@@ -111,61 +101,13 @@ class Transaction:
             self._amount = -amount_owned
             self._terminate_position = True
 
-    # ==============================================================================
-    # VNITŘNÍ METODY PRO VÝPOČET HISTORIE (DATAFRAME)
-    # ==============================================================================
-
-    # Vypočítá počáteční investovanou částku (Base)
-    def _create_base(self):
-        # Násobek množství a pořizovací ceny
-        self._transaction_prices["Base"] = self._amount * self._price
-
-    # Vypočítá kumulativní vývoj hodnoty (Growth) od data transakce
-    def _create_change(self):
-        # Výpočet denních výnosů od data transakce
-        returns = self._history.loc[self._date:, "return"]
-        returns = returns.reindex(index=self._transaction_prices.index)
-        returns = returns.fillna(0) + 1
-
-        # Výpočet změny ceny uvnitř dne nákupu vůči zavírací ceně
-        # $$ \text{intraday\_change} = \frac{\text{Close} - \text{Price}}{\text{Price}} + 1 $$
-        intraday_change = (self._history.iloc[0]["Close"] - self._price) / self._price + 1
-
-        if pd.isna(intraday_change):
-            intraday_change = (self._history.loc[self._first_record_date, "Close"] - self._price) / self._price + 1
-
-        # Nastavení úvodní změny na první den transakce
-        returns.iloc[0] = intraday_change
-
-        # Výpočet kumulativního produktu pro získání vývojové křivky
-        self._transaction_prices["Growth"] = returns.cumprod()
-
-    # Vypočítá průběžný zisk v absolutních hodnotách
-    def _create_profit(self):
-        # Rozdíl mezi aktuální hodnotou a základem
-        self._transaction_prices["Profit"] = self._transaction_prices["Base"] * (self._transaction_prices["Growth"] - 1)
-
-    # Vypočítá celkovou tržní cenu pozice v čase
-    def _create_price(self):
-        # Součet nákupního základu a dosaženého zisku
-        self._transaction_prices["Price"] = self._transaction_prices["Base"].add(self._transaction_prices["Profit"])
-
-    # Vytvoří masku platnosti dat na základě existence cen v historii
-    def _create_mask(self):
-        # Reindexace historie pro kontrolu děr v datech
-        _dates = pd.date_range(start=self._date, end=datetime.now().date(), freq='D')
-        self._history = self._history.reindex(_dates)
-
-        # Maska je True tam, kde máme k dispozici zavírací cenu
-        self._transaction_prices["Mask"] = self._history["Close"].notna()
-
     # ==============================================================================
     # VEŘEJNÉ PŘÍSTUPOVÉ METODY (GETTERY)
     # ==============================================================================
 
     # Vrátí nákupní základnu (Base)
     def get_base(self):
-        return self._transaction_prices["Base"]
+        return self.get_transaction()["Base"]
 
     # Vrátí počet kusů v transakci
     def get_amount(self) -> float:
@@ -175,9 +117,9 @@ class Transaction:
     def get_price(self) -> float:
         return self._price
 
-    # Vrátí kompletní DataFrame s vypočtenou historií
+    # Vrátí kompletní DataFrame s vypočtenou historií (sestavený úložištěm)
     def get_transaction(self):
-        return self._transaction_prices
+        return self._engine.transaction_frame(self._row)
 
     # Vrátí datum provedení transakce
     def get_date(self) -> datetime:
@@ -190,8 +132,8 @@ class Transaction:
 
 class LongTransaction(Transaction):
     def __init__(self, asset: Asset, date: datetime, amount_owned: float,
-                 amount: int = None, price: float = None):
-        super().__init__(asset, date, amount_owned, amount, price)
+                 amount: int = None, price: float = None, engine: TransactionEngine = None):
+        super().__init__(asset, date, amount_owned, amount, price, engine)
 
     # Nastaví parametry specifické pro nákup celých kusů
     def _set_parameters(self):
@@ -202,8 +144,8 @@ class LongTransaction(Transaction):
 
 class LongFractionTransaction(Transaction):
     def __init__(self, asset: Asset, date: datetime, amount_owned: float,
-                 amount: int = None, price: float = None):
-        super().__init__(asset, date, amount_owned, amount, price)
+                 amount: int = None, price: float = None, engine: TransactionEngine = None):
+        super().__init__(asset, date, amount_owned, amount, price, engine)
 
     # Nastaví parametry pro frakční nákup (přepočet množství z ceny)
     def _set_parameters(self):
@@ -214,7 +156,7 @@ class LongFractionTransaction(Transaction):
         # Určení aktuální zavírací ceny pro přepočet frakce
         close_price = self._record_to_date["Close"]
         if pd.isna(close_price):
-            close_price = self._history.loc[self._first_record_date, "Close"]
+            close_price = self._asset.get_first_record()["Close"]
 
         # Přepočet množství na základě vložené částky (v parametru price) a kurzu
         self._amount = self._price / close_price
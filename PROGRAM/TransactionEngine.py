@@ -0,0 +1,191 @@
+import numpy as np
+import pandas as pd
+from DayCalendar import day_calendar
+
+
+# ==============================================================================
+# POMOCNÉ FUNKCE
+# ==============================================================================
+
+# Převede libovolné datum (date, datetime, Timestamp) na numpy den
+def to_day(date) -> np.datetime64:
+    return np.datetime64(pd.Timestamp(date).date(), "D")
+
+
+# Vrátí denní osu od zadaného dne do dneška (výřez sdíleného kalendáře, budoucí den = osa o jednom dni)
+def daily_axis(start_day: np.datetime64) -> np.ndarray:
+    axis = day_calendar.get_days(start_day)
+    return axis if len(axis) else np.array([start_day], dtype="datetime64[D]")
+
+
+# ==============================================================================
+# SLOUPCOVÉ ÚLOŽIŠTĚ TRANSAKCÍ
+# ==============================================================================
+
+class TransactionEngine:
+    def __init__(self):
+        # Sloupce transakcí (průběžně plněné seznamy)
+        self._dates = []
+        self._amounts = []
+        self._prices = []
+        self._asset_ids = []
+
+        # Registr aktiv a převod aktivum -> id
+        self._assets = []
+        self._asset_index = {}
+
+        # Mezipaměti numpy sloupců a denních řad jednotlivých aktiv
+        self._columns = None
+        self._asset_series = {}
+
+    # ==============================================================================
+    # VNITŘNÍ METODY
+    # ==============================================================================
+
+    # Vrátí id aktiva, případně ho zaregistruje
+    def _get_asset_id(self, asset) -> int:
+        if asset not in self._asset_index:
+            self._asset_index[asset] = len(self._assets)
+            self._assets.append(asset)
+        return self._asset_index[asset]
+
+    # Vrátí sloupce transakcí jako numpy pole (sestaví je jen po změně)
+    def _get_columns(self) -> dict:
+        if self._columns is None:
+            self._columns = {
+                "date": np.array(self._dates, dtype="datetime64[D]"),
+                "amount": np.array(self._amounts, dtype=np.float64),
+                "price": np.array(self._prices, dtype=np.float64),
+                "asset_id": np.array(self._asset_ids, dtype=np.int64),
+            }
+        return self._columns
+
+    # Spočítá denní řady jednoho aktiva jedním vektorizovaným průchodem
+    def _build_asset_series(self, asset_id: int) -> dict:
+        columns = self._get_columns()
+        rows = np.flatnonzero(columns["asset_id"] == asset_id)
+        asset = self._assets[asset_id]
+
+        tx_days = columns["date"][rows]
+        base = columns["amount"][rows] * columns["price"][rows]
+
+        # Denní osa od první transakce aktiva do dneška
+        start_day = tx_days.min()
+        axis = daily_axis(start_day)
+
+        # Historie aktiva od nejbližšího záznamu k první transakci
+        history = asset.get_prices(pd.Timestamp(start_day).date())
+        history_days = pd.to_datetime(history.index).values.astype("datetime64[D]")
+        closes = history["Close"].to_numpy(dtype=np.float64)
+        returns = history["return"].to_numpy(dtype=np.float64)
+
+        # Umístění záznamů historie na denní osu
+        offsets = day_calendar.get_offsets(history_days, start_day)
+        on_axis = (offsets >= 0) & (offsets < len(axis))
+
+        daily_returns = np.zeros(len(axis))
+        daily_returns[offsets[on_axis]] = returns[on_axis]
+        daily_returns = np.nan_to_num(daily_returns, nan=0.0)
+
+        mask = np.zeros(len(axis), dtype=bool)
+        mask[offsets[on_axis]] = ~np.isnan(closes[on_axis])
+
+        # Kumulativní index vývoje ceny aktiva na denní ose
+        cumulative = np.cumprod(daily_returns + 1)
+
+        # Zavírací cena nejbližšího záznamu ke dni transakce (před historií -> první záznam)
+        anchor_rows = np.clip(np.searchsorted(history_days, tx_days, side="right") - 1, 0, None)
+        anchor_closes = closes[anchor_rows]
+        if np.isnan(anchor_closes).any():
+            first_record = asset.get_prices(asset.get_earliest_record_date()).iloc[0]["Close"]
+            anchor_closes = np.where(np.isnan(anchor_closes), first_record, anchor_closes)
+
+        # Změna ceny uvnitř dne transakce vůči zavírací ceně
+        prices = columns["price"][rows]
+        intraday = (anchor_closes - prices) / prices + 1
+        tx_offsets = (tx_days - start_day).astype(np.int64)
+
+        return {
+            "version": (asset.get_history_version(), day_calendar.get_today()),
+            "rows": rows,
+            "axis": axis,
+            "mask": mask,
+            "cumulative": cumulative,
+            "offsets": tx_offsets,
+            "base": base,
+            "intraday": intraday,
+        }
+
+    # Vrátí (případně dopočítá) denní řady aktiva; po obnovení historie aktiva nebo s novým dnem se řady přepočítají
+    def _get_asset_series(self, asset_id: int) -> dict:
+        series = self._asset_series.get(asset_id)
+        version = (self._assets[asset_id].get_history_version(), day_calendar.get_today())
+        if series is None or series["version"] != version:
+            series = self._build_asset_series(asset_id)
+            self._asset_series[asset_id] = series
+        return series
+
+    # ==============================================================================
+    # VEŘEJNÉ METODY
+    # ==============================================================================
+
+    # Uloží transakci do sloupců a vrátí číslo jejího řádku
+    def add_transaction(self, asset, date, amount: float, price: float) -> int:
+        asset_id = self._get_asset_id(asset)
+
+        self._dates.append(to_day(date))
+        self._amounts.append(amount)
+        self._prices.append(price)
+        self._asset_ids.append(asset_id)
+
+        # Zneplatnění mezipamětí dotčených novou transakcí
+        self._columns = None
+        self._asset_series.pop(asset_id, None)
+
+        return len(self._dates) - 1
+
+    # Vrátí počet transakcí v úložišti
+    def get_transaction_count(self) -> int:
+        return len(self._dates)
+
+    # Sestaví denní historii jedné transakce (Base/Profit/Price/Growth/Mask)
+    def transaction_frame(self, row: int) -> pd.DataFrame:
+        series = self._get_asset_series(self._asset_ids[row])
+        position = int(np.flatnonzero(series["rows"] == row)[0])
+        start = series["offsets"][position]
+        base = series["base"][position]
+
+        # Vývoj hodnoty transakce od jejího dne
+        cumulative = series["cumulative"][start:]
+        growth = series["intraday"][position] * cumulative / cumulative[0]
+
+        df = pd.DataFrame(index=pd.DatetimeIndex(series["axis"][start:], name="Date"))
+        df["Base"] = base
+        df["Profit"] = base * (growth - 1)
+        df["Price"] = df["Base"] + df["Profit"]
+        df["Growth"] = growth
+        df["Mask"] = series["mask"][start:]
+
+        return df
+
+    # Sestaví denní historii všech transakcí aktiva jako jednu pozici
+    def asset_frame(self, asset) -> pd.DataFrame:
+        series = self._get_asset_series(self._asset_index[asset])
+        axis = series["axis"]
+        offsets = series["offsets"]
+        cumulative = series["cumulative"]
+
+        # Události na denní ose: přírůstek báze a přírůstek "normované" hodnoty
+        base_events = np.zeros(len(axis))
+        value_events = np.zeros(len(axis))
+        np.add.at(base_events, offsets, series["base"])
+        np.add.at(value_events, offsets, series["base"] * series["intraday"] / cumulative[offsets])
+
+        # Schodová funkce báze a hodnota pozice jako násobek cenového indexu
+        df = pd.DataFrame(index=pd.DatetimeIndex(axis, name="Date"))
+        df["Base"] = np.cumsum(base_events)
+        df["Price"] = cumulative * np.cumsum(value_events)
+        df["Profit"] = df["Price"] - df["Base"]
+        df["Mask"] = series["mask"]
+
+        return df
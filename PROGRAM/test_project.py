@@ -1,11 +1,18 @@
+import time
+import threading
 import pytest
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 from datetime import datetime
 from unittest.mock import MagicMock, patch
 
 # Import testovaných komponent systému
-from DownloadManager import fill_gaps, _delete_outliers
+from DownloadManager import (fill_gaps, _delete_outliers, _normalize_history, get_last_business_day, DownloadManager,
+                             RateLimiter, _normalize_index, _delete_duplicit_data, _delete_flat_data,
+                             _close_initial_gap)
 from Portfolio import Portfolio, TransactionType
+from Asset import Stock
 
 # ==============================================================================
 # POMOCNÉ FUNKCE PRO TESTOVÁNÍ (MOCK DATA)
@@ -213,7 +220,7 @@ def test_overselling_protection(mock_get_info, mock_get_history, mock_to_csv, mo
     assert values[6] == 0
 
 # Ověřuje správnost matematického přepočtu pozice mezi různými měnami (Forex)
-@patch('Position.forex_creator')
+@patch('FxRates.forex_creator')
 @patch('pandas.DataFrame.to_csv')
 @patch('Asset.YfinanceManager.get_history')
 @patch('Asset.YfinanceManager.get_info')
@@ -241,4 +248,1013 @@ def test_currency_conversion(mock_get_info, mock_get_history, mock_to_csv, mock_
     pos = mock_portfolio.get_position("US_ASSET")
     pos_data = pos.get_position("EUR")
 
-    assert pos_data["Base"].iloc[-1] == pytest.approx(900.0)
\ No newline at end of file
+    assert pos_data["Base"].iloc[-1] == pytest.approx(900.0)
+
+# Ověřuje, že pohledy transakcí nad sloupcovým úložištěm dávají v součtu historii pozice
+def test_transaction_engine_views():
+    from TransactionEngine import TransactionEngine
+
+    # Simulované aktivum s rostoucí cenou
+    history_df = create_mock_history(start_date='2023-01-01', days=30, start_price=100.0, trend=1.0)
+    asset = MagicMock()
+    asset.get_prices.side_effect = lambda date: history_df.loc[history_df.index.asof(date):].copy()
+    asset.get_earliest_record_date.return_value = history_df.index[0]
+
+    # Dvě transakce uložené do jednoho úložiště
+    engine = TransactionEngine()
+    first = engine.add_transaction(asset, datetime(2023, 1, 5).date(), 10, 104.0)
+    second = engine.add_transaction(asset, datetime(2023, 1, 10).date(), -4, 110.0)
+
+    # Součet pohledů jednotlivých transakcí musí odpovídat jednomu průchodu přes aktivum
+    position_df = engine.asset_frame(asset)
+    summed_price = engine.transaction_frame(first)["Price"].add(engine.transaction_frame(second)["Price"],
+                                                                fill_value=0)
+    assert position_df["Price"].values == pytest.approx(summed_price.values)
+
+    # Hodnota pozice odpovídá držbě 6 kusů za poslední zavírací cenu
+    assert position_df["Price"].iloc[-1] == pytest.approx(6 * history_df["Close"].iloc[-1])
+    assert position_df["Base"].iloc[-1] == pytest.approx(10 * 104.0 - 4 * 110.0)
+
+# Ověřuje, že všechny způsoby agregace transakcí dávají stejnou historii pozice
+@patch('pandas.DataFrame.to_csv')
+@patch('Asset.YfinanceManager.get_history')
+@patch('Asset.YfinanceManager.get_info')
+def test_aggregation_backends_match(mock_get_info, mock_get_history, mock_to_csv, mock_portfolio):
+    mock_get_info.return_value = {"longName": "Backend Stock", "currency": "USD"}
+    mock_get_history.return_value = create_mock_history(start_date='2023-01-01', days=60, start_price=100.0, trend=0.5)
+
+    ticker = "BACKEND"
+    mock_portfolio.new_transaction(TransactionType.LONG, datetime(2023, 1, 5), ticker, amount=10, price=101.0)
+    mock_portfolio.new_transaction(TransactionType.LONG, datetime(2023, 1, 20), ticker, amount=5)
+    mock_portfolio.new_transaction(TransactionType.LONG, datetime(2023, 2, 10), ticker, amount=-12, price=120.0)
+
+    # Výpočet historie pozice každým způsobem agregace
+    position = mock_portfolio.get_position(ticker)
+    results = {}
+    for backend in ("loop", "stack", "engine"):
+        position.set_aggregation(backend)
+        results[backend] = position.get_position("USD").copy()
+
+    # Výsledky se musí shodovat s referenční smyčkou
+    for backend in ("stack", "engine"):
+        pd.testing.assert_frame_equal(results[backend], results["loop"], check_dtype=False, check_freq=False)
+
+    # Neznámý způsob agregace je odmítnut
+    with pytest.raises(ValueError):
+        position.set_aggregation("unknown")
+
+# Ověřuje maskovací algebru nad nezarovnanými maskami platnosti dat
+def test_mask_algebra():
+    from MaskAlgebra import mask_and, mask_or, first_valid_date
+
+    dates = pd.date_range('2023-01-01', periods=5, freq='D')
+    left = pd.Series([False, True, True, False, True], index=dates)
+    right = pd.Series([False, True, False], index=dates[2:])
+
+    # AND: chybějící dny se chovají jako platné (stejně jako Series.combine s fill_value=True)
+    expected_and = left.combine(right, func=lambda x, y: x & y, fill_value=True)
+    assert (mask_and(left, right) == expected_and).all()
+
+    # OR: chybějící dny se chovají jako neplatné
+    assert mask_or(left, right).tolist() == [False, True, True, True, True]
+
+    # První platný den a prázdná maska
+    assert first_valid_date(left) == dates[1]
+    assert first_valid_date(pd.Series(False, index=dates)) is None
+
+# Simulovaný poskytovatel dat pro testy manažera stahování (bez sítě a bez zápisu na disk)
+class FakeProviderManager(DownloadManager):
+    def __init__(self, remote_history: pd.DataFrame, stored_history: pd.DataFrame, incremental: bool = True):
+        super().__init__(incremental)
+        self.remote_history = remote_history
+        self.stored_history = stored_history
+        self.fetch_starts = []
+
+    def _fetch_history(self, ticker: str, start=None) -> pd.DataFrame:
+        self.fetch_starts.append(start)
+        if start is None:
+            return self.remote_history.copy()
+        return self.remote_history[self.remote_history.index.date >= start].copy()
+
+    def _load_daily_history(self, ticker: str) -> pd.DataFrame:
+        return self.stored_history.copy()
+
+    def _save_daily_history(self, ticker: str, stock_history: pd.DataFrame):
+        self.stored_history = stock_history.copy()
+
+# Vytvoří surovou historii ve formátu Yahoo Finance končící posledním pracovním dnem
+def create_raw_history(days: int = 80) -> pd.DataFrame:
+    dates = pd.bdate_range(end=get_last_business_day(), periods=days, tz="America/New_York")
+    close = 100 + np.sin(np.arange(days)) * 5 + np.arange(days) * 0.1
+    return pd.DataFrame({"Open": close, "High": close + 1, "Low": close - 1, "Close": close,
+                         "Volume": 1000}, index=dates)
+
+# Ověřuje, že inkrementální aktualizace stáhne jen nové dny a dá stejný výsledek jako plné stažení
+def test_incremental_history_update():
+    raw = create_raw_history()
+
+    # Chybný růstový výkyv na konci uložené historie, který se opraví až s novými daty
+    raw.iloc[69, raw.columns.get_loc("Close")] = 400.0
+    stored = _normalize_history(raw.iloc[:70].copy())
+
+    manager = FakeProviderManager(raw, stored)
+    updated = manager.get_history("FAKE")
+
+    # Stahovalo se jen od posledního uloženého dne a výsledek odpovídá plné normalizaci
+    assert manager.fetch_starts == [stored.index.max()]
+    pd.testing.assert_frame_equal(updated, _normalize_history(raw.copy()))
+    assert 400.0 not in updated["Close"].values
+
+    # Změna historických cen u poskytovatele (např. split) vynutí plné stažení
+    manager.remote_history = raw * 2
+    manager.stored_history = stored
+    manager.get_history("FAKE")
+    assert manager.fetch_starts[-1] is None
+
+# Ověřuje transparentní převod uložené CSV historie do binárního sloupcového formátu
+@pytest.mark.parametrize("history_format", ["parquet", "feather"])
+def test_binary_history_storage_migration(tmp_path, history_format):
+    pytest.importorskip("pyarrow")
+    from DownloadManager import CsvHistoryStorage, create_history_storage
+
+    # Historie uložená původním CSV úložištěm
+    history_df = create_mock_history(start_date='2023-01-01', days=15, start_price=100.0, trend=0.5)
+    history_df.index.name = "Date"
+    CsvHistoryStorage(str(tmp_path)).save("MIGRATE", history_df)
+    csv_history = CsvHistoryStorage(str(tmp_path)).load("MIGRATE")
+
+    # První čtení binárním úložištěm převede CSV, další čtení už jde z binárního souboru
+    storage = create_history_storage(history_format, str(tmp_path))
+    migrated = storage.load("MIGRATE")
+    assert (tmp_path / f"MIGRATE.history.{history_format}").exists()
+    reloaded = storage.load("MIGRATE")
+
+    pd.testing.assert_frame_equal(migrated, csv_history)
+    pd.testing.assert_frame_equal(reloaded, csv_history)
+
+# Ověřuje načtení historie aktiva z paměťově mapovaného cenového panelu bez kopie dat
+@patch('Asset.YfinanceManager.get_history')
+@patch('Asset.YfinanceManager.get_info')
+def test_price_panel_mapped_history(mock_get_info, mock_get_history, tmp_path):
+    from PricePanel import build_price_panel
+
+    # Panel se dvěma aktivy, jejichž historie končí posledním pracovním dnem
+    mock_get_info.return_value = {"longName": "Panel Stock", "currency": "USD"}
+    first = create_mock_history(start_date=get_last_business_day() - pd.Timedelta(days=29), days=30, trend=1.0)
+    second = create_mock_history(start_date=get_last_business_day() - pd.Timedelta(days=9), days=10, start_price=5.0)
+    panel = build_price_panel({"PANEL_A": first, "PANEL_B": second}, str(tmp_path))
+
+    with patch('Asset.price_panel', panel):
+        asset = Stock("PANEL_B")
+
+    # Historie se nestahovala a výřez sdílí paměť s namapovaným souborem
+    mock_get_history.assert_not_called()
+    prices = asset.get_prices(second.index[3])
+    assert np.shares_memory(prices.to_numpy(), panel._values)
+    assert prices["Close"].tolist() == second["Close"].iloc[3:].tolist()
+    assert asset.get_earliest_record_date() == second.index[0]
+
+# Přestavba panelu při namapované starší generaci zapíše novou generaci a stará mapování zůstanou čitelná
+def test_price_panel_rebuild_while_mapped(tmp_path):
+    from PricePanel import build_price_panel, remove_stale_generations, PricePanel
+
+    old_history = create_mock_history(days=5, start_price=10.0)
+    new_history = create_mock_history(days=8, start_price=20.0)
+    old_panel = build_price_panel({"PANEL_A": old_history}, str(tmp_path))
+    old_prices = old_panel.get_history("PANEL_A")
+
+    build_price_panel({"PANEL_A": new_history}, str(tmp_path))
+    old_panel.reload()
+    remove_stale_generations(str(tmp_path))
+
+    # Starý výřez čte stále původní data, nově otevřený panel vidí novou generaci
+    assert old_prices["Close"].tolist() == old_history["Close"].tolist()
+    assert PricePanel(str(tmp_path)).get_history("PANEL_A")["Close"].tolist() == new_history["Close"].tolist()
+    assert len(old_panel.get_history("PANEL_A")) == 8
+
+    # Přestavba zapíše jen změněný ticker, ostatní převezme; zůstává aktuální a předchozí generace
+    # a novější generace jiného procesu, která ještě není zveřejněná, se nesmaže
+    in_flight = tmp_path / "panel.ffffffffffffffff000000.values.npy"
+    np.save(in_flight, np.zeros((1, 4)))
+    build_price_panel({"PANEL_B": old_history}, str(tmp_path))
+    remove_stale_generations(str(tmp_path))
+    panel = PricePanel(str(tmp_path))
+    assert sorted(panel.get_tickers()) == ["PANEL_A", "PANEL_B"]
+    assert panel.get_history("PANEL_A")["Close"].tolist() == new_history["Close"].tolist()
+    assert in_flight.exists() and len(list(tmp_path.glob("panel.*.dates.npy"))) == 2
+
+# Čtenář, jehož index mezitím zastaral (pole už smazána), načte index znovu místo prázdného panelu
+def test_price_panel_stale_index_retry(tmp_path):
+    import json
+    import PricePanel as price_panel_module
+    from PricePanel import build_price_panel, PricePanel
+
+    build_price_panel({"PANEL_A": create_mock_history(days=5)}, str(tmp_path))
+    stale_index = json.loads((tmp_path / "panel.index.json").read_text())
+    build_price_panel({"PANEL_B": create_mock_history(days=6)}, str(tmp_path))
+    current_index = json.loads((tmp_path / "panel.index.json").read_text())
+    for path in tmp_path.glob(f"panel.{stale_index['generation']}.*.npy"):
+        path.unlink()
+
+    with patch.object(price_panel_module, '_read_index', side_effect=[stale_index, current_index]):
+        panel = PricePanel(str(tmp_path))
+    assert sorted(panel.get_tickers()) == ["PANEL_A", "PANEL_B"]
+
+# Simulovaný poskytovatel s více tickery, který měří souběžnost a jednou selže
+class ConcurrentFakeManager(DownloadManager):
+    rate_limiter = RateLimiter(requests_per_second=1000)
+    retry_backoff = 0.0
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.failed_once = set()
+        self.download_counts = {}
+        self.histories = {}
+        self.infos = {}
+
+    def _fetch_history(self, ticker: str, start=None) -> pd.DataFrame:
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.download_counts[ticker] = self.download_counts.get(ticker, 0) + 1
+        time.sleep(0.05)
+        with self.lock:
+            self.active -= 1
+            # První pokus o stažení tickeru "FLAKY" selže (ověření opakování)
+            if ticker == "FLAKY" and "FLAKY" not in self.failed_once:
+                self.failed_once.add("FLAKY")
+                raise ConnectionError("Simulovaný výpadek")
+
+        # Historie je pro každý ticker jiná, aby šlo poznat případné prohození dat mezi vlákny
+        return create_raw_history(days=20) * (1 + len(ticker))
+
+    def _download_stock_info(self, ticker: str) -> dict:
+        return {"longName": ticker}
+
+    def _load_daily_history(self, ticker: str) -> pd.DataFrame:
+        return self.histories.get(ticker, pd.DataFrame())
+
+    def _load_stock_info(self, ticker: str) -> dict:
+        return self.infos.get(ticker, {})
+
+    def _save_daily_history(self, ticker: str, stock_history: pd.DataFrame):
+        self.histories[ticker] = stock_history
+
+    def _save_stock_info(self, ticker: str, stock_info: dict):
+        self.infos[ticker] = stock_info
+
+# Ověřuje souběžné hromadné stažení dat včetně opakování po chybě
+def test_prefetch_concurrent_download():
+    manager = ConcurrentFakeManager()
+    tickers = [f"T{i}" for i in range(7)] + ["FLAKY", "T0"]
+
+    results = manager.prefetch(tickers, max_workers=4)
+
+    # Každý ticker stažen jednou, souběžně, a výpadek byl překonán opakováním
+    assert results == {ticker: True for ticker in dict.fromkeys(tickers)}
+    assert set(manager.histories) == set(results)
+    assert 1 < manager.max_active <= 4
+    assert manager.failed_once == {"FLAKY"}
+
+# Zátěžový test: souběžná volání manažera pro různé i stejné tickery si nepřepisují data
+def test_download_manager_concurrency_stress():
+    manager = ConcurrentFakeManager()
+    tickers = ["A", "BB", "CCC", "DDDD"]
+    calls = [tickers[i % len(tickers)] for i in range(64)]
+
+    def load(ticker):
+        return ticker, manager.get_info(ticker), manager.get_history(ticker)
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(load, calls))
+
+    # Každé volání dostalo data svého tickeru a každý ticker se stáhl právě jednou
+    for ticker, info, history in results:
+        assert info["longName"] == ticker
+        assert history["Close"].iloc[0] == pytest.approx(create_raw_history(days=20)["Close"].iloc[0] * (1 + len(ticker)))
+    assert manager.download_counts == {ticker: 1 for ticker in tickers}
+
+# Souborový zámek tickeru čeká na zámek jiného procesu a opuštěný zámek po čase odstraní
+def test_ticker_file_lock(tmp_path):
+    import os
+    from DownloadManager import TickerFileLock
+
+    lock_path = tmp_path / "HELD.lock"
+    lock_path.write_text("12345")
+    with pytest.raises(TimeoutError):
+        with TickerFileLock(str(lock_path), timeout=0.1):
+            pass
+
+    # Zámek starší než limit se považuje za opuštěný, po uvolnění soubor zmizí
+    os.utime(lock_path, (time.time() - 3600, time.time() - 3600))
+    with TickerFileLock(str(lock_path), timeout=0.1, stale_after=60):
+        assert lock_path.read_text().startswith(f"{os.getpid()}:")
+    assert not lock_path.exists()
+    assert not list(tmp_path.glob("*.stale"))
+
+    # Zámek, který mezitím převzal jiný proces, se při uvolnění nesmaže
+    with TickerFileLock(str(lock_path), timeout=0.1):
+        lock_path.write_text("other:token")
+    assert lock_path.read_text() == "other:token"
+
+# Čtení aktuální historie z cache nepotřebuje souborový zámek (funguje i nad adresářem jen pro čtení)
+def test_cached_history_read_without_file_lock(tmp_path):
+    from DownloadManager import CsvHistoryStorage
+
+    storage = CsvHistoryStorage(str(tmp_path))
+    history = create_mock_history(start_date=get_last_business_day() - pd.Timedelta(days=9), days=10)
+    history.index.name = "Date"
+    storage.save("CACHED", history)
+
+    manager = DownloadManager(storage=storage)
+    with patch('DownloadManager.TickerFileLock.__enter__', side_effect=PermissionError("read-only")):
+        loaded = manager.get_history("CACHED")
+    assert loaded["Close"].tolist() == pytest.approx(history["Close"].tolist())
+
+# Zátěžový test: souběžná tvorba aktiv vrací pro stejný ticker vždy stejnou instanci
+@patch('Asset.YfinanceManager.get_history')
+@patch('Asset.YfinanceManager.get_info')
+def test_parallel_asset_creation(mock_get_info, mock_get_history):
+    from Asset import asset_creator
+
+    mock_get_info.side_effect = lambda ticker: {"longName": ticker, "currency": "USD"}
+    mock_get_history.side_effect = lambda ticker: create_mock_history(days=10)
+    tickers = [f"PARALLEL_{i % 5}" for i in range(40)]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        assets = list(executor.map(asset_creator, tickers))
+
+    # Jedna instance na ticker a každá nese data svého tickeru
+    assert len({id(asset) for asset in assets}) == 5
+    assert all(asset.get_name() == ticker for asset, ticker in zip(assets, tickers))
+    assert mock_get_info.call_count == 5
+
+# Ověřuje správné párování výkyvů i při nestejném počtu růstů a pádů a volbu klouzavého mediánu
+def test_delete_outliers_pairing_and_rolling_median():
+    df = create_mock_history(days=30, start_price=100)
+
+    # Skutečný propad (pád bez předchozího růstu), který musí zůstat zachován
+    df.loc[df.index[5]:, 'Close'] = 40.0
+
+    # Chybný blok dvou dnů (růst a následný pád zpět)
+    df.loc[df.index[15], 'Close'] = 200.0
+    df.loc[df.index[16], 'Close'] = 210.0
+
+    cleaned_df = _delete_outliers(df)
+    assert list(cleaned_df.index) == [d for i, d in enumerate(df.index) if i not in (15, 16)]
+
+    # Jednodenní výkyv pod prahem denní změny zachytí až klouzavý medián
+    df = create_mock_history(days=30, start_price=100)
+    df.loc[df.index[10], 'Close'] = 180.0
+    assert len(_delete_outliers(df)) == len(df)
+    cleaned_df = _delete_outliers(df, growth_threshold=0.5, rolling_window=5)
+    assert 180.0 not in cleaned_df['Close'].values
+    assert len(cleaned_df) == len(df) - 1
+
+# Ověřuje, že jednoprůchodová normalizace dává stejný výsledek jako postupné čištění po krocích
+def test_normalize_history_matches_staged_pipeline():
+    raw = create_raw_history(120)
+    close = raw.columns.get_loc("Close")
+
+    # Chybný blok, duplicita vzniklá až po jeho odstranění, duplicity, plochý den a chybějící cena
+    raw.iloc[30:33, close] = raw.iloc[30:33, close] * 10
+    raw.iloc[33, close] = raw.iloc[29, close]
+    raw.iloc[50:53, close] = raw.iloc[49, close]
+    raw.iloc[70, raw.columns.get_loc("Low")] = raw.iloc[70, raw.columns.get_loc("High")]
+    raw.iloc[90, close] = np.nan
+
+    # Původní postup: každý krok samostatně nad výsledkem předchozího
+    staged = _normalize_index(raw.copy())
+    staged = _delete_outliers(staged)
+    staged = _delete_duplicit_data(staged)
+    staged = _delete_flat_data(staged)
+    staged = _close_initial_gap(staged)
+    with pytest.warns(FutureWarning):
+        staged['return'] = staged['Close'].pct_change()
+    staged.index.name = 'Date'
+
+    fused = _normalize_history(raw.copy())
+    pd.testing.assert_frame_equal(fused, staged)
+    assert len(fused) == len(raw) - 3 - 1 - 3 - 1
+
+# Ověřuje křížové kurzy přes pivotní měnu a jednorázové načtení každého základního páru
+@patch('FxRates.forex_creator')
+def test_fx_rate_matrix_triangulation(mock_forex):
+    from FxRates import FxRateMatrix
+
+    # Základní páry USD -> EUR a USD -> CZK (CZK začíná později a má víkendové mezery)
+    pairs = {"EUR": create_mock_history('2023-01-01', days=20, start_price=0.9, trend=0.01),
+             "CZK": create_mock_history('2023-01-05', days=16, start_price=22.0, trend=0.1).iloc[::2]}
+
+    def create_forex(from_currency, to_currency):
+        forex = MagicMock()
+        forex.get_prices.return_value = pairs[to_currency]
+        return forex
+
+    mock_forex.side_effect = create_forex
+
+    fx_rates = FxRateMatrix()
+    dates = pd.date_range('2023-01-01', periods=20, freq='D')
+    rates = fx_rates.get_rates("CZK", "EUR", dates)
+    inverse = fx_rates.get_rates("EUR", "CZK", dates)
+
+    # Kurz CZK -> EUR = (USD -> EUR) / (USD -> CZK) s doplněnými mezerami
+    eur = pairs["EUR"]["Close"].set_axis(pd.to_datetime(pairs["EUR"].index))
+    czk = pairs["CZK"]["Close"].set_axis(pd.to_datetime(pairs["CZK"].index))
+    np.testing.assert_allclose(rates["Close"], (eur.reindex(dates) / czk.reindex(dates).ffill()).bfill())
+    np.testing.assert_allclose(inverse["Close"] * rates["Close"], 1.0)
+
+    # Platné jsou jen dny se skutečným záznamem obou párů
+    assert list(rates["Mask"]) == [d in set(czk.index) for d in dates]
+
+    # Aktuální kurz a převod do pivotní měny bez dalšího stahování
+    assert fx_rates.get_rate("USD", "EUR") == pytest.approx(pairs["EUR"]["Close"].iloc[-1])
+    assert mock_forex.call_count == 2
+
+# Ověřuje, že se verze kurzů zvýší po obnovení historie páru i po změně dne a matice se přestaví
+@patch('FxRates.forex_creator')
+def test_fx_rate_matrix_version_tracking(mock_forex):
+    from FxRates import FxRateMatrix
+
+    forex = MagicMock()
+    forex.get_history_version.return_value = 1
+    forex.get_prices.return_value = create_mock_history('2023-01-01', days=10, start_price=0.9)
+    mock_forex.return_value = forex
+
+    fx_rates = FxRateMatrix()
+    dates = pd.date_range('2023-01-01', periods=10, freq='D')
+    fx_rates.get_rates("USD", "EUR", dates)
+    version = fx_rates.get_version()
+    fx_rates.get_rates("USD", "EUR", dates)
+    assert fx_rates.get_version() == version and forex.get_prices.call_count == 1
+
+    # Obnovená historie páru: nová verze a nové kurzy
+    forex.get_history_version.return_value = 2
+    forex.get_prices.return_value = create_mock_history('2023-01-01', days=10, start_price=0.5)
+    assert fx_rates.get_version() == version + 1
+    assert fx_rates.get_rates("USD", "EUR", dates)["Close"].iloc[0] == pytest.approx(0.5)
+
+    # Nový den: matice se přestaví i beze změny historie
+    with patch('FxRates.datetime') as mock_datetime:
+        mock_datetime.now.return_value = datetime.now() + pd.Timedelta(days=1)
+        assert fx_rates.get_version() == version + 2
+
+# Ověřuje, že Forex doplní mezery jen jednou, vrací data pouze pro čtení a po obnovení historie je přepočítá
+@patch('Asset.YfinanceManager.get_history')
+@patch('Asset.YfinanceManager.get_info')
+def test_forex_filled_history_cache(mock_get_info, mock_get_history):
+    from Asset import Forex
+
+    mock_get_info.return_value = {"longName": "USDEUR", "currency": "EUR"}
+    history = create_mock_history('2023-01-01', days=20, start_price=0.9).iloc[::3]
+    mock_get_history.return_value = history
+
+    with patch('Asset.fill_gaps', wraps=fill_gaps) as mock_fill_gaps:
+        forex = Forex("USDEUR=X")
+        prices = forex.get_prices(history.index[0])
+        forex.get_prices(history.index[3])
+        forex.get_rate()
+
+        # Jedno doplnění pro všechna volání, původní historie zůstává beze změny
+        assert mock_fill_gaps.call_count == 1
+        pd.testing.assert_frame_equal(forex._daily_history, history)
+        assert prices.index.freq == "D" and len(prices) == (datetime.now().date() - history.index[0]).days + 1
+
+        # Sdílená data nelze měnit na místě
+        with pytest.raises(ValueError):
+            prices.iloc[0, 0] = 0.0
+
+        # Obnovení historie zneplatní doplněná data
+        mock_get_history.return_value = create_mock_history('2023-01-01', days=20, start_price=1.1)
+        forex.refresh_history()
+        assert forex.get_prices(history.index[0])["Close"].iloc[0] == 1.1
+        assert mock_fill_gaps.call_count == 2
+
+# Ověřuje přepočet nákupní základny historickými kurzy v dnech jednotlivých transakcí
+@patch('FxRates.forex_creator')
+@patch('pandas.DataFrame.to_csv')
+@patch('Asset.YfinanceManager.get_history')
+@patch('Asset.YfinanceManager.get_info')
+def test_currency_exchange_cost_basis(mock_get_info, mock_get_history, mock_to_csv, mock_forex, mock_portfolio):
+    mock_portfolio.change_currency("EUR")
+    mock_get_info.return_value = {"longName": "FX Base Stock", "currency": "USD"}
+    mock_get_history.return_value = create_mock_history(days=30, start_price=100.0, trend=1.0)
+
+    # Kurz USD -> EUR rostoucí každý den
+    rates = create_mock_history(days=30, start_price=0.80, trend=0.01)
+    mock_forex.return_value.get_prices.return_value = rates
+
+    # Nákupy a prodej v různých dnech (různé historické kurzy)
+    transactions = [(datetime(2023, 1, 3), 10), (datetime(2023, 1, 10), 5), (datetime(2023, 1, 20), -4)]
+    for date, amount in transactions:
+        mock_portfolio.new_transaction(TransactionType.LONG, date, "FX_BASE_ASSET", amount=amount)
+
+    pos_data = mock_portfolio.get_position("FX_BASE_ASSET").get_position("EUR")
+
+    # Očekávaná schodová funkce: součet báze * kurz dne transakce od daného dne dál
+    expected = pd.Series(0.0, index=pos_data.index)
+    for date, amount in transactions:
+        close = 100.0 + (date - datetime(2023, 1, 1)).days
+        rate = 0.80 + 0.01 * (date - datetime(2023, 1, 1)).days
+        expected[expected.index >= date] += amount * close * rate
+
+    np.testing.assert_allclose(pos_data["Base"], expected)
+
+# Ověřuje odložené načítání aktiva: informace a historie se stáhnou až při prvním použití a jen jednou
+@patch('Asset.YfinanceManager.get_history')
+@patch('Asset.YfinanceManager.get_info')
+def test_lazy_asset_loading(mock_get_info, mock_get_history):
+    from Asset import asset_creator, asset_cache
+
+    mock_get_info.return_value = {"longName": "Lazy Stock", "currency": "USD"}
+    mock_get_history.return_value = create_mock_history(days=10)
+
+    asset = asset_creator("LAZY_ASSET", lazy=True)
+    assert asset_creator("LAZY_ASSET") is asset
+    mock_get_info.assert_not_called()
+    mock_get_history.assert_not_called()
+
+    # Informace stačí pro měnu a název, historie se zatím nenačítá
+    assert asset.get_currency() == "USD" and asset.get_name() == "Lazy Stock"
+    assert mock_get_info.call_count == 1
+    assert not asset.is_history_loaded()
+
+    # První práce s cenami načte historii, další už ne
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(lambda _: asset.get_prices(datetime(2023, 1, 3).date()), range(8)))
+    assert mock_get_history.call_count == 1
+    assert asset.is_history_loaded()
+
+    asset_cache.pop("LAZY_ASSET")
+
+# Ověřuje LRU vyřazování podle rozpočtu paměti, statistiky zásahů a explicitní zneplatnění
+@patch('Asset.YfinanceManager.get_history')
+@patch('Asset.YfinanceManager.get_info')
+def test_asset_cache_lru_budget(mock_get_info, mock_get_history):
+    from AssetCache import AssetCache
+
+    mock_get_info.return_value = {"longName": "Cached Stock", "currency": "USD"}
+    mock_get_history.side_effect = lambda ticker: create_mock_history(days=100)
+
+    stocks = {ticker: Stock(ticker) for ticker in ["LRU_A", "LRU_B", "LRU_C"]}
+    size = stocks["LRU_A"].memory_usage()
+    assert size >= stocks["LRU_A"]._daily_history.memory_usage(deep=True).sum() > 0
+
+    # Rozpočet na dvě aktiva: vložení třetího vyřadí nejdéle nepoužité
+    cache = AssetCache(max_bytes=int(size * 2.5))
+    cache["LRU_A"] = stocks["LRU_A"]
+    cache["LRU_B"] = stocks["LRU_B"]
+    assert cache.get("LRU_A") is stocks["LRU_A"]
+    cache["LRU_C"] = stocks["LRU_C"]
+
+    assert "LRU_B" not in cache and "LRU_A" in cache and "LRU_C" in cache
+    assert cache.get("LRU_B") is None
+
+    # Zneplatnění tickeru a statistiky využití
+    assert cache.invalidate("LRU_A") and not cache.invalidate("LRU_A")
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["entries"]) == (1, 1, 1, 1)
+    assert stats["bytes"] == size
+
+    # Nově vytvořená instance po vyřazení je zaměnitelná s původní (např. jako klíč pozice)
+    assert Stock("LRU_B") == stocks["LRU_B"] and {stocks["LRU_B"]: 1}[Stock("LRU_B")] == 1
+
+# Vložení měří jen nový záznam a odložené aktivum ohlásí svou velikost až po načtení historie
+@patch('Asset.YfinanceManager.get_history')
+@patch('Asset.YfinanceManager.get_info')
+def test_asset_cache_incremental_sizes(mock_get_info, mock_get_history):
+    import AssetCache as asset_cache_module
+    from AssetCache import AssetCache
+
+    mock_get_info.return_value = {"longName": "Sized Stock", "currency": "USD"}
+    mock_get_history.side_effect = lambda ticker: create_mock_history(days=100)
+
+    cache = AssetCache(max_bytes=10 ** 9)
+    with patch('AssetCache.estimate_size', wraps=asset_cache_module.estimate_size) as mock_estimate:
+        for i in range(20):
+            cache[f"SIZE_{i}"] = Stock(f"SIZE_{i}")
+        assert mock_estimate.call_count == 20
+
+    lazy = Stock("SIZE_LAZY", lazy=True)
+    cache["SIZE_LAZY"] = lazy
+    before = cache.get_stats()["bytes"]
+    lazy.get_history_version()
+    assert cache.get_stats()["bytes"] == before + lazy.memory_usage() > before
+
+# Ověřuje seřazenou neměnnou historii, výřezy bez kopie a kopii na vyžádání pro úpravy
+@patch('Asset.YfinanceManager.get_history')
+@patch('Asset.YfinanceManager.get_info')
+def test_asset_history_read_only_slices(mock_get_info, mock_get_history):
+    mock_get_info.return_value = {"longName": "Frozen Stock", "currency": "USD"}
+    history = create_mock_history(days=20, trend=1.0)
+    mock_get_history.return_value = history.iloc[::-1]
+
+    asset = Stock("FROZEN_ASSET")
+    assert asset._daily_history.index.is_monotonic_increasing
+    assert asset.get_earliest_record_date() == history.index[0]
+
+    # Výřez sdílí paměť s historií aktiva a nelze ho měnit na místě
+    prices = asset.get_prices(history.index[5])
+    assert np.shares_memory(prices["Close"].to_numpy(), asset._daily_history["Close"].to_numpy())
+    assert prices["Close"].tolist() == history["Close"].iloc[5:].tolist()
+    with pytest.raises(ValueError):
+        prices.iloc[0, prices.columns.get_loc("Close")] = 0.0
+
+    # Kopie na vyžádání je zapisovatelná a historii aktiva neovlivní
+    prices = asset.get_prices(history.index[5], copy=True)
+    prices.iloc[0, prices.columns.get_loc("Close")] = 0.0
+    assert asset.get_prices(history.index[5])["Close"].iloc[0] == history["Close"].iloc[5]
+
+# Ověřuje vyhledávání záznamů k datu přes předpočítaný index (jednotlivě i dávkově) proti pandas asof
+@patch('Asset.YfinanceManager.get_history')
+@patch('Asset.YfinanceManager.get_info')
+def test_asof_index_lookups(mock_get_info, mock_get_history):
+    from AsofIndex import AsofIndex
+    from Asset import Forex
+
+    history = create_mock_history('2023-01-02', days=30, trend=1.0).iloc[::3]
+    mock_get_info.return_value = {"longName": "Asof Stock", "currency": "USD"}
+    mock_get_history.return_value = history
+    asset = Stock("ASOF_ASSET")
+
+    # Dávkové vyhledání odpovídá pandas asof, data před historií dávají -1 a prázdný řádek
+    dates = list(pd.date_range('2022-12-30', '2023-02-05', freq='D').date)
+    expected = [history.index.get_loc(history.index.asof(d)) if d >= history.index[0] else -1 for d in dates]
+    assert AsofIndex(history.index).locate_many(dates).tolist() == expected
+
+    records = asset.get_records(dates)
+    assert records["Close"].isna().tolist() == [e < 0 for e in expected]
+    assert records["Close"].dropna().tolist() == [history["Close"].iloc[e] for e in expected if e >= 0]
+    assert asset.get_record(datetime(2023, 1, 6)).equals(history.iloc[1])
+    assert asset.get_record(datetime(2022, 12, 1)) is None
+
+    # Kurzy Forexu (datum před historií dostane první kurz)
+    forex = Forex("USDASOF=X")
+    assert forex.get_rate(datetime(2022, 12, 1)) == history["Close"].iloc[0]
+    assert forex.get_rate(datetime(2023, 1, 7, 12)) == history["Close"].iloc[1]
+    np.testing.assert_array_equal(forex.get_rates([datetime(2023, 1, 7), datetime(2023, 1, 11)]),
+                                  history["Close"].iloc[[1, 3]].to_numpy())
+
+# Ověřuje uložené výsledky pozice pro více měn a jejich zneplatnění novou transakcí a obnovením historie
+@patch('FxRates.forex_creator')
+@patch('pandas.DataFrame.to_csv')
+@patch('Asset.YfinanceManager.get_history')
+@patch('Asset.YfinanceManager.get_info')
+def test_position_results_per_currency(mock_get_info, mock_get_history, mock_to_csv, mock_forex, mock_portfolio):
+    mock_get_info.return_value = {"longName": "Memo Stock", "currency": "USD"}
+    mock_get_history.return_value = create_mock_history(days=30, start_price=100.0, trend=1.0)
+    mock_forex.return_value.get_prices.return_value = create_mock_history(days=30, start_price=0.5)
+
+    mock_portfolio.new_transaction(TransactionType.LONG, datetime(2023, 1, 3), "MEMO_ASSET", amount=10)
+    mock_portfolio.new_transaction(TransactionType.LONG, datetime(2023, 1, 10), "MEMO_ASSET", amount=-4, price=120.0)
+    pos = mock_portfolio.get_position("MEMO_ASSET")
+
+    # Střídání měn dává stále stejné (nezměněné) výsledky a realizovaný zisk se nepřepočítává opakovaně
+    usd = pos.get_position("USD").copy()
+    eur = pos.get_position("EUR").copy()
+    realized_eur = pos.get_last_value()[9]
+    with patch.object(pos, "_add_transactions", wraps=pos._add_transactions) as mock_add:
+        pd.testing.assert_frame_equal(pos.get_position("USD"), usd)
+        pd.testing.assert_frame_equal(pos.get_position("EUR"), eur)
+        mock_add.assert_not_called()
+    assert pos.get_last_value()[9] == pytest.approx(realized_eur)
+    np.testing.assert_allclose(eur["Price"], usd["Price"] * 0.5)
+
+    # Obnovení historie aktiva přepočítá výsledek nad novými cenami
+    mock_get_history.return_value = create_mock_history(days=30, start_price=200.0, trend=1.0)
+    pos._asset.refresh_history()
+    assert pos.get_position("USD")["Price"].iloc[-1] > 1.5 * usd["Price"].iloc[-1]
+
+    # Nová transakce zneplatní uložené výsledky
+    mock_portfolio.new_transaction(TransactionType.LONG, datetime(2023, 1, 20), "MEMO_ASSET", amount=4)
+    assert pos.get_last_value()[6] == 10
+    assert pos.get_position("USD")["Base"].iloc[-1] > usd["Base"].iloc[-1]
+
+# Ověřuje export historií pozic na pozadí, zápis jen při změně obsahu a binární formát
+@pytest.mark.parametrize("export_format", ["csv", "parquet"])
+def test_position_exporter(tmp_path, export_format):
+    from PositionExport import PositionExporter
+
+    if export_format != "csv":
+        pytest.importorskip("pyarrow")
+
+    df = pd.DataFrame({"Base": np.arange(5.0), "Price": np.arange(5.0) * 1.1, "Mask": True},
+                      index=pd.date_range('2023-01-01', periods=5, freq='D', name='Date'))
+
+    exporter = PositionExporter(export_format, str(tmp_path))
+    assert exporter.export("Stock", df)
+    assert not exporter.export("Stock", df.copy())
+    exporter.flush()
+
+    # Soubor je zapsaný a otisk platí i pro nový běh programu
+    path = tmp_path / f"Stock.history.{export_format}"
+    modified = path.stat().st_mtime_ns
+    assert not PositionExporter(export_format, str(tmp_path)).export("Stock", df)
+
+    # Změněný obsah se zapíše znovu
+    changed = df.copy()
+    changed.iloc[-1, 1] = 100.0
+    assert exporter.export("Stock", changed)
+    exporter.flush()
+    assert path.stat().st_mtime_ns >= modified
+    reloaded = pd.read_csv(path, index_col="Date") if export_format == "csv" else pd.read_parquet(path)
+    assert reloaded["Price"].iloc[-1] == 100.0
+
+# Ověřuje, že jakákoli chyba zápisu neukončí vlákno exportu a otisk se zahodí (další export se zopakuje)
+def test_position_exporter_write_failure(tmp_path):
+    from PositionExport import PositionExporter
+
+    df = pd.DataFrame({"Base": np.arange(3.0), "Mask": True},
+                      index=pd.date_range('2023-01-01', periods=3, freq='D', name='Date'))
+    exporter = PositionExporter("csv", str(tmp_path))
+
+    with patch.object(exporter._storage, 'save', side_effect=ValueError("bad frame")):
+        assert exporter.export("Broken", df)
+        exporter.flush()
+    assert exporter._worker.is_alive()
+
+    # Po selhání se stejný obsah zapíše znovu a flush neuvízne
+    assert exporter.export("Broken", df)
+    exporter.flush()
+    assert (tmp_path / "Broken.history.csv").exists()
+    assert not exporter.export("Broken", df)
+
+# Ověřuje, že jedna redukce nad maticí pozic dává stejný výsledek jako postupné sčítání pozic
+@patch('pandas.DataFrame.to_csv')
+@patch('Asset.YfinanceManager.get_history')
+@patch('Asset.YfinanceManager.get_info')
+def test_stacked_position_reduction(mock_get_info, mock_get_history, mock_to_csv, mock_portfolio):
+    from MaskAlgebra import mask_and
+
+    histories = {f"PAR_{i}": create_mock_history(start_date=f'2023-01-{1 + 3 * i:02d}', days=25,
+                                                 start_price=50.0 + 10 * i, trend=0.5 * (i - 2)) for i in range(5)}
+    mock_get_info.return_value = {"longName": "Parallel Stock", "currency": "USD"}
+    mock_get_history.side_effect = lambda ticker: histories[ticker]
+
+    for i, ticker in enumerate(histories):
+        mock_portfolio.new_transaction(TransactionType.LONG, datetime(2023, 1, 3 + 3 * i), ticker, amount=i + 1)
+
+    # Referenční výsledek: postupné sčítání pozic
+    mock_portfolio._create_first_date()
+    mock_portfolio._create_portfolio_prices()
+    expected = mock_portfolio._portfolio_prices.copy()
+    for position in mock_portfolio._position_dict.values():
+        pos_data = position.get_position("USD")
+        for column in ["Base", "Profit", "Price"]:
+            expected[column] = expected[column].add(pos_data[column], fill_value=0)
+        expected["Mask"] = mask_and(expected["Mask"], pos_data["Mask"])
+
+    # Jedna redukce nad maticí pozice x den dává stejný výsledek
+    for position in mock_portfolio._position_dict.values():
+        position._invalidate_results()
+    mock_portfolio._create_portfolio_prices()
+    mock_portfolio._add_positions()
+    pd.testing.assert_frame_equal(mock_portfolio._portfolio_prices, expected, check_dtype=False)
+
+# Ověřuje dávkové vykreslení grafů ve sdíleném poolu procesů a opakované vykreslení jen u grafů se změněnými daty
+def test_chart_renderer_cache(tmp_path):
+    import ChartRenderer as chart_renderer_module
+    from ChartRenderer import ChartRenderer
+
+    df = pd.DataFrame({"Price": np.linspace(100.0, 150.0, 60), "Growth": np.linspace(0.0, 0.5, 60), "Mask": True},
+                      index=pd.date_range('2023-01-01', periods=60, freq='D', name='Date'))
+    df.loc[df.index[20:30], "Mask"] = False
+
+    renderer = ChartRenderer(directory=str(tmp_path), max_workers=2, min_pool_jobs=2)
+    renderer.add(df, df.index[0], "Test ceny", "Price")
+    renderer.add(df, df.index[0], "Test růstu", "Growth")
+    assert len(renderer) == 2
+    assert sorted(renderer.render()) == ["Test ceny", "Test růstu"]
+    assert (tmp_path / "Test ceny.png").exists() and (tmp_path / "Test růstu.png").exists()
+
+    # Pool procesů vzniká jednou a další renderery ho sdílejí
+    pools = dict(chart_renderer_module._pools)
+    other = ChartRenderer(directory=str(tmp_path), max_workers=2, min_pool_jobs=2)
+    other.add(df, df.index[0], "Test báze", "Price")
+    other.add(df, df.index[0], "Test profitu", "Growth")
+    assert sorted(other.render()) == ["Test báze", "Test profitu"]
+    assert chart_renderer_module._pools == pools and len(pools) == 1
+
+    # Nezměněná data se znovu nevykreslují, změněná ano
+    df.loc[df.index[-1], "Price"] = 200.0
+    renderer.add(df, df.index[0], "Test ceny", "Price")
+    renderer.add(df, df.index[0], "Test růstu", "Growth")
+    assert renderer.render() == ["Test ceny"]
+    assert len(renderer) == 0
+
+    # Chybějící sloupec graf do dávky nezařadí
+    renderer.add(df, df.index[0], "Test chyby", "Profit")
+    assert len(renderer) == 0
+
+# Ověřuje vykreslení čáry jedním objektem s barvami podle masky a zředění metodou LTTB
+def test_masked_line_collection():
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import to_rgba
+    from Asset import draw_masked_line, lttb_indices
+
+    dates = pd.date_range('2000-01-01', periods=1000, freq='D')
+    values = np.sin(np.arange(1000) / 20.0)
+    values[500] = 10.0
+    mask = (np.arange(1000) // 7) % 2 == 0
+
+    # Střídavá maska dává jeden objekt (ne stovky čar) s barvou úseku podle jeho prvního dne
+    fig, ax = plt.subplots()
+    collection = draw_masked_line(ax, dates, values, mask)
+    assert len(ax.lines) == 0 and len(ax.collections) == 1
+    assert len(collection.get_segments()) == 999
+    colors = collection.get_colors()
+    assert tuple(colors[0]) == to_rgba('black') and tuple(colors[7]) == to_rgba('gray')
+
+    # Zředění zachová krajní body i výraznou špičku
+    collection = draw_masked_line(ax, dates, values, mask, max_points=100)
+    assert len(collection.get_segments()) == 99
+    plt.close(fig)
+
+    selected = lttb_indices(np.arange(1000.0), values, 100)
+    assert len(selected) == 100 and selected[0] == 0 and selected[-1] == 999
+    assert 500 in selected and np.all(np.diff(selected) > 0)
+    np.testing.assert_array_equal(lttb_indices(np.arange(10.0), values[:10], 100), np.arange(10))
+
+# Ověřuje přírůstkové vyhodnocení ze snímku: nezměněné pozice dopočítají jen nové dny a výsledek odpovídá
+# kompletnímu přepočtu, pozice s novou transakcí se přepočítá celá
+@patch('FxRates.forex_creator')
+@patch('pandas.DataFrame.to_csv')
+@patch('Asset.YfinanceManager.get_history')
+@patch('Asset.YfinanceManager.get_info')
+def test_incremental_evaluation_snapshot(mock_get_info, mock_get_history, mock_to_csv, mock_forex, tmp_path):
+    from PortfolioSnapshot import PortfolioSnapshot
+    from ChartRenderer import ChartRenderer
+
+    # Zmrazený "dnešek" ve všech modulech, které staví denní osu do dneška
+    class FrozenDatetime(datetime):
+        frozen = None
+
+        @classmethod
+        def now(cls, tz=None):
+            return cls.frozen
+
+    history_a = create_mock_history(days=120, start_price=100.0, trend=1.5)
+    history_a = history_a[np.arange(120) % 7 < 5]
+    history_a["return"] = history_a["Close"].pct_change()
+    histories = {"SNAP_A": history_a, "SNAP_B": create_mock_history(days=120, start_price=50.0, trend=-0.2)}
+    mock_get_info.side_effect = lambda ticker: {"longName": ticker, "currency": "USD" if ticker == "SNAP_A" else "EUR"}
+    mock_get_history.side_effect = lambda ticker: histories[ticker]
+    mock_forex.return_value.get_prices.return_value = create_mock_history(days=120, start_price=0.9, trend=0.002)
+
+    # Export na disk probíhá až po uložení snímku (snímek zachycuje stav před exportem)
+    def check_snapshot_saved(name, df):
+        assert (tmp_path / "snap.pkl").exists()
+        return True
+
+    def evaluate(day, snapshot=None, extra_transaction=False):
+        FrozenDatetime.frozen = day
+        portfolio = Portfolio("Snapshot_Portfolio", "USD")
+        portfolio.new_transaction(TransactionType.LONG, datetime(2023, 1, 5), "SNAP_A", amount=10)
+        portfolio.new_transaction(TransactionType.LONG, datetime(2023, 1, 20), "SNAP_A", amount=-4, price=130.0)
+        portfolio.new_transaction(TransactionType.LONG, datetime(2023, 1, 10), "SNAP_B", amount=5)
+        if extra_transaction:
+            portfolio.new_transaction(TransactionType.LONG, datetime(2023, 3, 1), "SNAP_B", amount=2)
+
+        # Celé vyhodnocení včetně obnovy a uložení snímku (grafy v aktuálním procesu do dočasného adresáře)
+        exporter = MagicMock()
+        exporter.export.side_effect = check_snapshot_saved
+        renderer = ChartRenderer(directory=str(tmp_path), use_processes=False)
+        portfolio.evaluate_portfolio(exporter=exporter if snapshot is not None else None, renderer=renderer,
+                                     snapshot=snapshot)
+        assert snapshot is None or exporter.export.called
+
+        # Pozice převzaté ze snímku se nepočítaly celé
+        restored = sum(position._native_result is None for position in portfolio._position_dict.values())
+        return portfolio, restored
+
+    with patch('DayCalendar.datetime', FrozenDatetime), patch('Asset.datetime', FrozenDatetime), \
+            patch('FxRates.datetime', FrozenDatetime), patch('Portfolio.save_price_panel'), \
+            patch('Portfolio.yfinance_manager'), patch.object(Portfolio, 'export_portfolio_to_pdf'):
+        _, restored = evaluate(datetime(2023, 2, 15, 12), PortfolioSnapshot("snap", str(tmp_path)))
+        assert restored == 0
+
+        # Další běh o měsíc později: obě pozice ze snímku, bez kompletního výpočtu, stejný výsledek
+        incremental, restored = evaluate(datetime(2023, 3, 20, 12), PortfolioSnapshot("snap", str(tmp_path)))
+        full, _ = evaluate(datetime(2023, 3, 20, 12))
+        assert restored == 2
+        assert all(position._native_result is None for position in incremental._position_dict.values())
+        pd.testing.assert_frame_equal(incremental._portfolio_prices, full._portfolio_prices)
+        for ticker in histories:
+            pd.testing.assert_frame_equal(incremental.get_position(ticker).get_position("USD"),
+                                          full.get_position(ticker).get_position("USD"))
+            assert incremental.get_position(ticker).get_last_value()[5:] == \
+                   pytest.approx(full.get_position(ticker).get_last_value()[5:])
+
+        # Nová transakce: pozice se přepočítá celá, ostatní se převezmou ze snímku
+        changed, restored = evaluate(datetime(2023, 3, 25, 12), PortfolioSnapshot("snap", str(tmp_path)),
+                                     extra_transaction=True)
+        full, _ = evaluate(datetime(2023, 3, 25, 12), extra_transaction=True)
+        assert restored == 1
+        pd.testing.assert_frame_equal(changed._portfolio_prices, full._portfolio_prices)
+
+# Ověřuje, že uložené výsledky pozic po půlnoci v běžícím procesu pokryjí i nový den (pozice bez převodu měn)
+@patch('pandas.DataFrame.to_csv')
+@patch('Asset.YfinanceManager.get_history')
+@patch('Asset.YfinanceManager.get_info')
+def test_position_results_roll_over_day(mock_get_info, mock_get_history, mock_to_csv):
+    class FrozenDatetime(datetime):
+        frozen = None
+
+        @classmethod
+        def now(cls, tz=None):
+            return cls.frozen
+
+    histories = {"DAY_A": create_mock_history(days=60, start_price=100.0, trend=1.0),
+                 "DAY_B": create_mock_history(days=60, start_price=40.0, trend=-0.1)}
+    mock_get_info.side_effect = lambda ticker: {"longName": ticker, "currency": "USD"}
+    mock_get_history.side_effect = lambda ticker: histories[ticker]
+
+    def create_portfolio():
+        portfolio = Portfolio("Day_Portfolio", "USD")
+        portfolio.new_transaction(TransactionType.LONG, datetime(2023, 1, 5), "DAY_A", amount=3)
+        portfolio.new_transaction(TransactionType.LONG, datetime(2023, 1, 12), "DAY_B", amount=7)
+        return portfolio
+
+    def evaluate(portfolio):
+        portfolio._create_first_date()
+        portfolio._create_portfolio_prices()
+        portfolio._add_positions()
+        return portfolio._portfolio_prices
+
+    with patch('DayCalendar.datetime', FrozenDatetime), patch('Asset.datetime', FrozenDatetime), \
+            patch('FxRates.datetime', FrozenDatetime):
+        FrozenDatetime.frozen = datetime(2023, 2, 15, 23, 59)
+        portfolio = create_portfolio()
+        evaluate(portfolio)
+
+        # Stejné portfolio po půlnoci: poslední řádek odpovídá kompletnímu přepočtu a obsahuje obě pozice
+        FrozenDatetime.frozen = datetime(2023, 2, 16, 0, 1)
+        rolled = evaluate(portfolio)
+        full = evaluate(create_portfolio())
+        assert rolled.index[-1] == pd.Timestamp('2023-02-16')
+        pd.testing.assert_series_equal(rolled.iloc[-1], full.iloc[-1])
+        assert rolled["Price"].iloc[-1] > 0
+
+# Ověřuje sdílený kalendář (výřezy jedné osy) a průběžně udržované první datum pozice
+@patch('pandas.DataFrame.to_csv')
+@patch('Asset.YfinanceManager.get_history')
+@patch('Asset.YfinanceManager.get_info')
+def test_day_calendar_and_first_date(mock_get_info, mock_get_history, mock_to_csv, mock_portfolio):
+    from DayCalendar import DayCalendar
+
+    calendar = DayCalendar()
+    today = pd.Timestamp(datetime.now().date())
+    dates = calendar.get_dates(datetime(2023, 3, 1))
+    pd.testing.assert_index_equal(dates, pd.date_range('2023-03-01', today, freq='D'))
+
+    # Pozdější začátek je výřezem stejné osy, dřívější osu rozšíří
+    later = calendar.get_dates(datetime(2023, 6, 1).date())
+    assert np.shares_memory(later.values, dates.values) and later.freq == 'D'
+    earlier = calendar.get_dates(pd.Timestamp('2022-12-30'))
+    pd.testing.assert_index_equal(earlier, pd.date_range('2022-12-30', today, freq='D'))
+    assert len(calendar.get_dates(today + pd.Timedelta(days=5))) == 0
+
+    # První datum pozice se udržuje při přidávání transakcí (i mimo pořadí)
+    mock_get_info.return_value = {"longName": "Calendar Stock", "currency": "USD"}
+    mock_get_history.return_value = create_mock_history(days=30, start_price=100.0)
+    mock_portfolio.new_transaction(TransactionType.LONG, datetime(2023, 1, 20), "CAL_ASSET", amount=5)
+    mock_portfolio.new_transaction(TransactionType.LONG, datetime(2023, 1, 5), "CAL_ASSET", amount=5)
+    mock_portfolio.new_transaction(TransactionType.LONG, datetime(2023, 1, 25), "CAL_ASSET", amount=-2)
+    pos = mock_portfolio.get_position("CAL_ASSET")
+    assert pos.get_first_date() == datetime(2023, 1, 5).date()
+
+    mock_portfolio._create_first_date()
+    mock_portfolio._create_portfolio_prices()
+    assert mock_portfolio._portfolio_prices.index[0] == pd.Timestamp('2023-01-05')
+    assert pos.get_position("USD").index[0] == pd.Timestamp('2023-01-05')
+
+# Ověřuje zarovnání přes celočíselné posuny dnů (objektový i datetime index) a kurzy mimo rozsah matice
+@patch('FxRates.forex_creator')
+def test_calendar_offset_alignment(mock_forex):
+    from DayCalendar import day_calendar
+    from FxRates import FxRateMatrix
+
+    # Posuny dnů nezávisí na typu indexu ani na čase během dne
+    origin = datetime(2023, 1, 1)
+    object_index = pd.date_range('2023-01-01', periods=3).date
+    np.testing.assert_array_equal(day_calendar.get_offsets(object_index, origin), [0, 1, 2])
+    np.testing.assert_array_equal(day_calendar.get_offsets([datetime(2023, 1, 5, 18), datetime(2022, 12, 31)], origin),
+                                  [4, -1])
+    assert day_calendar.get_offset(pd.Timestamp('2023-02-01'), origin.date()) == 31
+
+    # Doplnění mezer odpovídá zarovnání přes reindex
+    history = create_mock_history(start_date='2023-01-01', days=20, start_price=10.0, trend=0.5).iloc[::3]
+    expected = history[['Close', 'Low', 'High']].reindex(
+        pd.date_range('2023-01-01', datetime.now().date(), freq='D', name='Date')).ffill()
+    pd.testing.assert_frame_equal(fill_gaps(history), expected)
+
+    # Kurzy pro den před maticí (první kurz, neplatná maska) a pro dny v matici
+    mock_forex.return_value.get_prices.return_value = pd.DataFrame(
+        {"Close": [0.5, 0.6, 0.7]}, index=pd.date_range('2023-01-10', periods=3).date)
+    dates = pd.DatetimeIndex(['2023-01-01', '2023-01-10', '2023-01-11', '2023-03-01'])
+    rates = FxRateMatrix().get_rates("USD", "EUR", dates)
+    np.testing.assert_allclose(rates["Close"], [0.5, 0.5, 0.6, 0.7])
+    assert rates["Mask"].tolist() == [False, True, True, False]